@@ -0,0 +1,200 @@
+"""Benchmark `SurveysStream.parse_response` on synthetic Hotjar exports.
+
+Every case downloads a zipped export with multilingual headers and multi-line
+free text answers from the local mock server and runs it through
+`parse_response`, in a fresh process so peak memory is measured per case.
+Results are written as JSON to compare parser implementations and releases:
+
+    python benchmarks/bench_parse.py --rows 1000 100000 --output before.json
+    python benchmarks/bench_parse.py --rows 1000 100000 --compare before.json
+
+Extra stream settings, e.g. `{"memory_soft_limit_mb": 1}` to force the
+streaming parser, are passed with `--config`.
+
+The file also holds pytest-benchmark tests for the smaller sizes:
+
+    pytest benchmarks/bench_parse.py
+"""
+
+import argparse
+import datetime
+import json
+import multiprocessing
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Optional
+
+import requests
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from tap_hotjar.metrics import peak_rss_bytes  # noqa: E402
+from tap_hotjar.tests.mock_hotjar import (  # noqa: E402
+    MULTILINGUAL_QUESTIONS,
+    MockHotjarServer,
+    write_export_zip,
+)
+
+DEFAULT_ROWS = [1000, 10000, 100000, 1000000, 5000000]
+DATA_DIR = Path(tempfile.gettempdir()) / "tap-hotjar-bench"
+STREAM_NAME = "survey_b2c_prod_tr_nps"
+
+
+def export_zip(rows: int) -> Path:
+    """Return the path of a synthetic export with `rows` responses."""
+    path = DATA_DIR / f"export-{rows}.zip"
+    if not path.exists():
+        DATA_DIR.mkdir(parents=True, exist_ok=True)
+        partial = path.with_suffix(".partial")
+        write_export_zip(partial, rows, MULTILINGUAL_QUESTIONS)
+        partial.rename(path)
+    return path
+
+
+class ZipServer(MockHotjarServer):
+    """Mock server serving a pre-generated export file for every survey."""
+
+    def __init__(self, zip_path: Path) -> None:
+        super().__init__()
+        self.zip_path = zip_path
+
+    def export_zip(self, site_id: str, survey_id: str) -> bytes:
+        return self.zip_path.read_bytes()
+
+
+def export_response(download_url: str) -> requests.Response:
+    """Build the export API response pointing at `download_url`."""
+    response = requests.Response()
+    response.status_code = 200
+    response._content = json.dumps({"download_url": download_url}).encode()
+    response.elapsed = datetime.timedelta(0)
+    return response
+
+
+def make_stream(config: dict):
+    """Return the benchmarked survey stream."""
+    from tap_hotjar.tap import TapHotJar
+
+    tap = TapHotJar(
+        config={"email": "bench@example.com", "password": "x", **config},
+        parse_env_config=False,
+    )
+    return tap.streams[STREAM_NAME]
+
+
+def run_case(zip_path: str, config: dict) -> dict:
+    """Parse one export and return its measurements."""
+    with ZipServer(Path(zip_path)) as server:
+        stream = make_stream({**config, "api_url": server.api_url})
+        response = export_response(f"{server.url}/downloads/1-1.zip")
+        rss_before = peak_rss_bytes()
+        start = time.perf_counter()
+        first_record = None
+        rows = 0
+        for _ in stream.parse_response(response):
+            if first_record is None:
+                first_record = time.perf_counter() - start
+            rows += 1
+        seconds = time.perf_counter() - start
+    return {
+        "rows": rows,
+        "zip_bytes": Path(zip_path).stat().st_size,
+        "seconds": round(seconds, 4),
+        "rows_per_second": round(rows / seconds, 1) if seconds else None,
+        "time_to_first_record": round(first_record or 0.0, 4),
+        "peak_rss_bytes": peak_rss_bytes(),
+        "peak_rss_growth_bytes": peak_rss_bytes() - rss_before,
+    }
+
+
+def run_isolated(zip_path: Path, config: dict) -> dict:
+    """Run a case in a fresh interpreter so its peak RSS is its own."""
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        return pool.apply(run_case, (str(zip_path), config))
+
+
+def git_revision() -> Optional[str]:
+    """Return the checked out commit, if any."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: List[dict], baseline_path: str) -> None:
+    """Print each case's change against a previous results file."""
+    baseline = {
+        case["rows"]: case for case in json.loads(Path(baseline_path).read_text())["results"]
+    }
+    for case in results:
+        before = baseline.get(case["rows"])
+        if not before:
+            continue
+        changes = ", ".join(
+            f"{key} {case[key] / before[key] - 1:+.1%}"
+            for key in ("seconds", "time_to_first_record", "peak_rss_bytes")
+            if before.get(key)
+        )
+        print(f"{case['rows']:>9} rows: {changes}")
+
+
+def main() -> None:
+    """Run the benchmark from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=DEFAULT_ROWS)
+    parser.add_argument("--config", type=json.loads, default={})
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Compare against a previous results file")
+    args = parser.parse_args()
+
+    results = []
+    for rows in args.rows:
+        case = run_isolated(export_zip(rows), args.config)
+        results.append(case)
+        print(
+            f"{rows:>9} rows: {case['seconds']:>8.3f}s "
+            f"{case['rows_per_second']:>12,.0f} rows/s "
+            f"first record {case['time_to_first_record']:.3f}s "
+            f"peak RSS {case['peak_rss_bytes'] / 2 ** 20:,.0f} MiB",
+            file=sys.stderr,
+        )
+
+    report = {
+        "benchmark": "parse_response",
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "config": args.config,
+        "results": results,
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+    else:
+        print(json.dumps(report, indent=2))
+    if args.compare:
+        compare(results, args.compare)
+
+
+def test_parse_response(benchmark):
+    """pytest-benchmark: parse a 10k row export end to end."""
+    zip_path = export_zip(10000)
+    with ZipServer(zip_path) as server:
+        stream = make_stream({"api_url": server.api_url})
+        url = f"{server.url}/downloads/1-1.zip"
+        rows = benchmark(lambda: sum(1 for _ in stream.parse_response(export_response(url))))
+    assert rows == 10000
+
+
+if __name__ == "__main__":
+    main()
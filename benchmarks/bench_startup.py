@@ -0,0 +1,199 @@
+"""Benchmark tap startup and discovery against committed thresholds.
+
+Measures importing `tap_hotjar.tap`, constructing `TapHotJar`,
+`discover_streams()` and generating the `--discover` catalog, both for the
+real stream catalog and for a synthetic catalog of 1,000 surveys. Each
+measurement is the median of several runs and is checked against
+`startup_thresholds.json`; the script exits with status 1 on a regression:
+
+    python benchmarks/bench_startup.py --output startup.json
+
+The threshold check also runs as a test:
+
+    pytest benchmarks/bench_startup.py
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+THRESHOLDS_FILE = Path(__file__).parent / "startup_thresholds.json"
+CONFIG = {"email": "bench@example.com", "password": "x"}
+SYNTHETIC_SURVEYS = 1000
+REPEAT = 5
+
+IMPORT_SNIPPET = (
+    "import time; start = time.perf_counter(); import tap_hotjar.tap; "
+    "print(time.perf_counter() - start)"
+)
+
+
+def median_seconds(func: Callable[[], object], repeat: int = REPEAT) -> float:
+    """Return the median wall time of `func` over `repeat` calls."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def measure_import(repeat: int = REPEAT) -> float:
+    """Median time to import the tap module in a fresh interpreter."""
+    timings = [
+        float(
+            subprocess.run(
+                [sys.executable, "-c", IMPORT_SNIPPET],
+                cwd=ROOT,
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout
+        )
+        for _ in range(repeat)
+    ]
+    return statistics.median(timings)
+
+
+def measure_discover_cli(repeat: int = REPEAT) -> float:
+    """Median wall time of `tap-hotjar --discover`, interpreter start included."""
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as config:
+        json.dump(CONFIG, config)
+    command = [
+        sys.executable,
+        "-c",
+        "from tap_hotjar.tap import TapHotJar; TapHotJar.cli()",
+        "--config",
+        config.name,
+        "--discover",
+    ]
+    try:
+        return median_seconds(
+            lambda: subprocess.run(
+                command, cwd=ROOT, capture_output=True, check=True
+            ),
+            repeat,
+        )
+    finally:
+        Path(config.name).unlink()
+
+
+def synthetic_tap_class(surveys: int):
+    """Return a tap class discovering `surveys` generated survey streams."""
+    from singer_sdk import typing as th
+
+    from tap_hotjar.streams import SurveysStream, clean
+    from tap_hotjar.tap import TapHotJar
+
+    stream_types = []
+    for index in range(surveys):
+        schema = th.PropertiesList(
+            th.Property("Number", th.IntegerType),
+            th.Property("User", th.StringType),
+            th.Property("Date Submitted", th.StringType),
+            th.Property("Country", th.StringType),
+            th.Property("Source URL", th.StringType),
+            th.Property("Device", th.StringType),
+            th.Property("Browser", th.StringType),
+            th.Property("OS", th.StringType),
+            th.Property("Hotjar User ID", th.StringType),
+            th.Property(clean(f"Question {index}: recommanderiez-vous ?"), th.NumberType),
+            th.Property(clean(f"Question {index}: pourquoi cette note ?"), th.StringType),
+            th.Property(clean(f"Question {index}: professionnel ou particulier ?"), th.StringType),
+        ).to_dict()
+        stream_types.append(
+            type(
+                f"SyntheticSurvey{index}",
+                (SurveysStream,),
+                {
+                    "name": f"survey_synthetic_{index}",
+                    "site_id": "1",
+                    "survey_id": str(index),
+                    "schema": schema,
+                },
+            )
+        )
+
+    class SyntheticTap(TapHotJar):
+        def discover_streams(self):
+            return [stream_class(tap=self) for stream_class in stream_types]
+
+    return SyntheticTap
+
+
+def measure_catalog(tap_class) -> Dict[str, float]:
+    """Measure construction, stream discovery and catalog generation."""
+    tap = tap_class(config=CONFIG, parse_env_config=False)
+    return {
+        "construct": median_seconds(
+            lambda: tap_class(config=CONFIG, parse_env_config=False)
+        ),
+        "discover_streams": median_seconds(tap.discover_streams),
+        "catalog": median_seconds(
+            lambda: tap_class(config=CONFIG, parse_env_config=False).catalog_json_text
+        ),
+    }
+
+
+def run() -> Dict[str, Dict[str, float]]:
+    """Run every measurement."""
+    from tap_hotjar.tap import TapHotJar
+
+    return {
+        "current": {
+            "import": measure_import(),
+            **measure_catalog(TapHotJar),
+            "discover_cli": measure_discover_cli(),
+        },
+        f"synthetic_{SYNTHETIC_SURVEYS}": measure_catalog(
+            synthetic_tap_class(SYNTHETIC_SURVEYS)
+        ),
+    }
+
+
+def regressions(results: Dict[str, Dict[str, float]]) -> List[str]:
+    """Return a description of every measurement over its threshold."""
+    thresholds = json.loads(THRESHOLDS_FILE.read_text())
+    failures = []
+    for catalog, measurements in results.items():
+        for name, seconds in measurements.items():
+            limit = thresholds.get(catalog, {}).get(name)
+            if limit is not None and seconds > limit:
+                failures.append(f"{catalog}.{name}: {seconds:.3f}s > {limit:.3f}s")
+    return failures
+
+
+def main() -> None:
+    """Run the benchmark from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = run()
+    for catalog, measurements in results.items():
+        for name, seconds in measurements.items():
+            print(f"{catalog:>15} {name:<17} {seconds:8.3f}s", file=sys.stderr)
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+    failures = regressions(results)
+    for failure in failures:
+        print(f"REGRESSION {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+def test_startup_within_thresholds():
+    """Startup and discovery stay within the committed thresholds."""
+    assert regressions(run()) == []
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Compact sets of response numbers, small enough to keep in Singer state.
+
+A set is held as its sorted runs of consecutive numbers, `(first, last)`
+pairs. It is serialised as the gap before each run and the run's length,
+LEB128 varints, compressed with zlib and base64 encoded, so a survey whose
+responses are mostly contiguous takes a few bytes whatever its size.
+"""
+
+import base64
+import zlib
+from typing import Iterable, Iterator, List, Tuple
+
+Runs = List[Tuple[int, int]]
+
+
+def number_runs(numbers: Iterable[int]) -> Runs:
+    """Return the runs of consecutive numbers in `numbers`."""
+    runs: Runs = []
+    for number in sorted(set(numbers)):
+        if runs and number == runs[-1][1] + 1:
+            runs[-1] = (runs[-1][0], number)
+        else:
+            runs.append((number, number))
+    return runs
+
+
+def run_numbers(runs: Runs) -> Iterator[int]:
+    """Yield the numbers in `runs`, in order."""
+    for first, last in runs:
+        yield from range(first, last + 1)
+
+
+def run_count(runs: Runs) -> int:
+    """Return how many numbers `runs` hold."""
+    return sum(last - first + 1 for first, last in runs)
+
+
+def runs_difference(runs: Runs, other: Runs) -> Runs:
+    """Return the runs of the numbers in `runs` but not in `other`, in linear time."""
+    difference: Runs = []
+    index = 0
+    for first, last in runs:
+        while index < len(other) and other[index][1] < first:
+            index += 1
+        scan = index
+        while first <= last:
+            if scan == len(other) or other[scan][0] > last:
+                difference.append((first, last))
+                break
+            if other[scan][0] > first:
+                difference.append((first, other[scan][0] - 1))
+            first = max(first, other[scan][1] + 1)
+            scan += 1
+    return difference
+
+
+def runs_gaps(runs: Runs, start: int = 1) -> Runs:
+    """Return the runs of the numbers from `start` up to the last of `runs` missing from them."""
+    return runs_difference([(start, runs[-1][1])] if runs else [], runs)
+
+
+def _write_varint(out: bytearray, value: int) -> None:
+    while value > 0x7F:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varints(data: bytes) -> Iterator[int]:
+    value = shift = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            yield value
+            value = shift = 0
+
+
+def encode_runs(runs: Runs) -> str:
+    """Serialise runs of non-negative numbers to a base64 string."""
+    out = bytearray()
+    previous = -1
+    for first, last in runs:
+        _write_varint(out, first - previous - 1)
+        _write_varint(out, last - first)
+        previous = last
+    return base64.b64encode(zlib.compress(bytes(out), 9)).decode("ascii")
+
+
+def decode_runs(text: str) -> Runs:
+    """Read runs serialised by `encode_runs`."""
+    values = _read_varints(zlib.decompress(base64.b64decode(text)))
+    runs: Runs = []
+    previous = -1
+    for gap, length in zip(values, values):
+        first = previous + gap + 1
+        previous = first + length
+        runs.append((first, previous))
+    return runs
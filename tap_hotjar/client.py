@@ -1,8 +1,10 @@
 """REST client handling, including HotJarStream base class."""
 
 import requests
+import time
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Any, Dict, Optional, Union, List, Iterable
+from typing import Any, Callable, Dict, Optional, Union, List, Iterable, Iterator
 
 from memoization import cached
 
@@ -10,19 +12,109 @@ from singer_sdk.helpers.jsonpath import extract_jsonpath
 from singer_sdk.streams import RESTStream
 from singer_sdk.authenticators import APIKeyAuthenticator
 
+from tap_hotjar.metrics import StreamMetrics
+from tap_hotjar.profiling import profile_to, stream_profile_path
+from tap_hotjar.tracing import get_tracer
+
 
 SCHEMAS_DIR = Path(__file__).parent / Path("./schemas")
 
+DEFAULT_API_URL = "https://insights.hotjar.com/api"
+
+# How many records to produce between two memory samples of a streamed stage.
+MEMORY_SAMPLE_INTERVAL = 10000
+
 
 class HotJarStream(RESTStream):
     """HotJar stream class."""
 
-    url_base = "https://insights.hotjar.com/api"
-    auth_url = "https://insights.hotjar.com/api/v2/users"
-
     records_jsonpath = "$[*]"  # Or override `parse_response`.
     next_page_token_jsonpath = "$.next_page"  # Or override `get_next_page_token`.
 
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.metrics = StreamMetrics(self.logger, self.metric_tags)
+        self.tracer = get_tracer(self.config.get("trace_file"))
+
+    @property
+    def url_base(self) -> str:
+        return self.config.get("api_url") or DEFAULT_API_URL
+
+    @property
+    def auth_url(self) -> str:
+        return f"{self.url_base}/v2/users"
+
+    @property
+    def metric_tags(self) -> Dict[str, Any]:
+        """Tags attached to every metric emitted for this stream."""
+        return {"stream": self.name}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Measure one stage of the sync (login, export, download, ...)."""
+        with self.tracer.span(name, **self.metric_tags), self.metrics.stage(name):
+            yield
+
+    def record_stage(self, name: str, seconds: float) -> None:
+        """Record a stage that was timed elsewhere and has just finished."""
+        self.tracer.record(name, seconds, **self.metric_tags)
+        self.metrics.add_time(name, seconds)
+
+    def timed_iter(
+        self,
+        name: str,
+        items: Iterable[Any],
+        counter: Optional[str] = None,
+        record: Optional[Callable[[float], None]] = None,
+    ) -> Iterator[Any]:
+        """Yield from `items`, recording the time spent producing them as a stage.
+
+        Used for lazily evaluated stages, whose work is interleaved with the
+        emission of records. The number of items is added to `counter`. The
+        time is passed to `record` instead, if given.
+        """
+        iterator = iter(items)
+        elapsed = 0.0
+        count = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                elapsed += time.perf_counter() - start
+                break
+            elapsed += time.perf_counter() - start
+            count += 1
+            if count % MEMORY_SAMPLE_INTERVAL == 0:
+                self.metrics.sample_memory()
+            yield item
+        self.metrics.sample_memory()
+        if record:
+            record(elapsed)
+        else:
+            self.record_stage(name, elapsed)
+        if counter:
+            self.metrics.increment(counter, count)
+
+    def sync(self, context: Optional[dict] = None) -> None:
+        """Sync the stream and log its performance summary.
+
+        The sync also counts towards the stream's `total` timer, which the
+        export pipeline adds the stream's prefetching to.
+        """
+        profile_dir = self.config.get("profile_dir")
+        with self.stage("sync"), self.metrics.stage("total"):
+            if profile_dir:
+                with profile_to(stream_profile_path(profile_dir, self.name)):
+                    self.sync_stream(context)
+            else:
+                self.sync_stream(context)
+        self.metrics.log_summary()
+
+    def sync_stream(self, context: Optional[dict] = None) -> None:
+        """Sync the stream itself, by default emitting Singer messages."""
+        super().sync(context)
+
     @property
     def authenticator(self) -> APIKeyAuthenticator:
         credentials = {
@@ -31,7 +123,8 @@ class HotJarStream(RESTStream):
             "password": self.config.get("password"),
             "remember": False,
         }
-        self._requests_session.post(self.auth_url, json=credentials)
+        with self.stage("login"):
+            self._requests_session.post(self.auth_url, json=credentials)
         self._http_headers.update({"X-Acc": self._requests_session.cookies['ACC']})
         return
 
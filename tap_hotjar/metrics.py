@@ -0,0 +1,156 @@
+"""Sync performance metrics for tap-hotjar."""
+
+import json
+import logging
+import os
+import resource
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+
+def peak_rss_bytes() -> int:
+    """Return the peak resident set size of the current process in bytes."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def current_rss_bytes() -> int:
+    """Return the current resident set size of the process in bytes.
+
+    Falls back to the peak RSS where /proc is not available.
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        return peak_rss_bytes()
+
+
+class StreamMetrics:
+    """Stage timers and counters collected while syncing one stream.
+
+    Every measurement is logged as a Singer metric line as soon as it is taken
+    and accumulated, so a summary can be written once the sync is over.
+    """
+
+    def __init__(
+        self, logger: logging.Logger, tags: Optional[Dict[str, Any]] = None
+    ) -> None:
+        self.logger = logger
+        self.tags: Dict[str, Any] = dict(tags or {})
+        self.timers: Dict[str, float] = {}
+        self.counters: Dict[str, int] = {}
+        self.gauges: Dict[str, float] = {}
+        self.peak_rss = 0
+
+    @contextmanager
+    def stage(self, name: str, **tags: Any) -> Iterator[None]:
+        """Time the wrapped block as sync stage `name`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.sample_memory()
+            self.add_time(name, time.perf_counter() - start, **tags)
+
+    def sample_memory(self) -> int:
+        """Sample the process RSS and update this stream's high-water mark."""
+        rss = current_rss_bytes()
+        self.peak_rss = max(self.peak_rss, rss)
+        return rss
+
+    def add_time(self, stage: str, seconds: float, **tags: Any) -> None:
+        """Record `seconds` spent in `stage`."""
+        self.timers[stage] = self.timers.get(stage, 0.0) + seconds
+        self.emit("timer", "hotjar.stage.duration", seconds, stage=stage, **tags)
+
+    def increment(self, counter: str, value: int = 1, **tags: Any) -> None:
+        """Add `value` to `counter`."""
+        self.counters[counter] = self.counters.get(counter, 0) + value
+        self.emit("counter", counter, value, **tags)
+
+    def gauge(self, name: str, value: float, **tags: Any) -> None:
+        """Set gauge `name` to `value`."""
+        self.gauges[name] = value
+        self.emit("gauge", name, value, **tags)
+
+    def timed_emit(self, records: Iterable[dict]) -> Iterator[dict]:
+        """Yield `records`, timing the downstream work done between them."""
+        elapsed = 0.0
+        for record in records:
+            start = time.perf_counter()
+            yield record
+            elapsed += time.perf_counter() - start
+        self.add_time("emit", elapsed)
+
+    def log_summary(self) -> None:
+        """Emit the derived throughput and memory gauges for the sync.
+
+        Throughput is over the `total` time spent on the stream, which also
+        covers its export, download and parse when they were prefetched.
+        """
+        rows = self.counters.get("hotjar.parse.rows", 0)
+        duration = self.timers.get("total", self.timers.get("sync", 0.0))
+        if duration:
+            self.gauge("hotjar.sync.rows_per_second", round(rows / duration, 2))
+        self.gauge("hotjar.stream.peak_rss_bytes", self.peak_rss)
+        self.gauge("hotjar.process.peak_rss_bytes", peak_rss_bytes())
+
+    def emit(self, metric_type: str, metric: str, value: Any, **tags: Any) -> None:
+        """Log a single Singer metric point."""
+        point = {
+            "type": metric_type,
+            "metric": metric,
+            "value": value,
+            "tags": {**self.tags, **tags},
+        }
+        self.logger.info("METRIC: %s", json.dumps(point))
+
+
+def _prometheus_labels(tags: Dict[str, Any]) -> str:
+    pairs = []
+    for key, value in sorted(tags.items()):
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"')
+        value = value.replace("\n", "\\n")
+        pairs.append(f'{key}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _prometheus_name(metric: str) -> str:
+    return "tap_hotjar_" + metric.replace("hotjar.", "", 1).replace(".", "_")
+
+
+def write_prometheus_textfile(
+    path: str, streams_metrics: Iterable[StreamMetrics]
+) -> None:
+    """Write the collected metrics in the node exporter textfile format.
+
+    The file is written next to its destination and renamed into place, so the
+    exporter never scrapes a partially written file.
+    """
+    samples: Dict[str, list] = {}
+    for metrics in streams_metrics:
+        for stage, seconds in metrics.timers.items():
+            labels = _prometheus_labels({**metrics.tags, "stage": stage})
+            samples.setdefault("tap_hotjar_stage_seconds", []).append(
+                f"tap_hotjar_stage_seconds{labels} {seconds:.6f}"
+            )
+        for name, value in {**metrics.counters, **metrics.gauges}.items():
+            labels = _prometheus_labels(metrics.tags)
+            prom_name = _prometheus_name(name)
+            samples.setdefault(prom_name, []).append(f"{prom_name}{labels} {value}")
+
+    lines = []
+    for prom_name, values in sorted(samples.items()):
+        lines.append(f"# TYPE {prom_name} gauge")
+        lines.extend(values)
+
+    target = Path(path)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+    tmp.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    os.replace(tmp, target)
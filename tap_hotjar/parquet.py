@@ -0,0 +1,47 @@
+"""Parquet output of parsed survey exports, for warehouse bulk loads."""
+
+import os
+from pathlib import Path
+from typing import List
+
+# Partition of the rows without a submission date.
+UNKNOWN_DATE = "unknown"
+
+
+def write_partitions(
+    table,
+    directory: str,
+    stream: str,
+    survey_id: str,
+    date_column: str = "Date Submitted",
+) -> List[str]:
+    """Write an export's Arrow table as Parquet files partitioned by stream, survey and date.
+
+    Files are laid out as
+    `stream=<name>/survey_id=<id>/date=<YYYY-MM-DD>/part-0.parquet` under
+    `directory`, so a full export rewrites each partition in place, and streams
+    reading the same survey keep their own files. Every file is written to a
+    temporary name of this process first, so loaders never see partial files
+    and shard processes never share one. Returns the paths written. Requires
+    pyarrow.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+    if date_column in table.column_names:
+        dates = pc.utf8_slice_codeunits(table.column(date_column).cast(pa.string()), 0, 10)
+        dates = pc.fill_null(dates, UNKNOWN_DATE)
+    else:
+        dates = pa.array([UNKNOWN_DATE] * table.num_rows, pa.string())
+
+    survey_dir = Path(directory) / f"stream={stream}" / f"survey_id={survey_id}"
+    paths = []
+    for date in sorted(pc.unique(dates).to_pylist()):
+        path = survey_dir / f"date={date}" / "part-0.parquet"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        partial = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        pq.write_table(table.filter(pc.equal(dates, date)), partial)
+        os.replace(partial, path)
+        paths.append(str(path))
+    return paths
@@ -0,0 +1,915 @@
+"""Parsing of zipped Hotjar survey CSV exports."""
+
+import csv
+import io
+import multiprocessing
+import re
+import threading
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+from itertools import islice
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    FrozenSet,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+import numpy as np
+import pandas as pd
+
+from tap_hotjar.transforms import ValueTransform
+
+# Strings `pd.read_csv` reads as missing values by default. The streaming
+# parser treats them the same way so both paths emit identical records.
+PANDAS_NA_VALUES = frozenset(
+    [
+        "",
+        "#N/A",
+        "#N/A N/A",
+        "#NA",
+        "-1.#IND",
+        "-1.#QNAN",
+        "-NaN",
+        "-nan",
+        "1.#IND",
+        "1.#QNAN",
+        "<NA>",
+        "N/A",
+        "NA",
+        "NULL",
+        "NaN",
+        "n/a",
+        "nan",
+        "null",
+    ]
+)
+
+# Rough peak memory of the eager parse per byte of uncompressed CSV: the
+# decoded text, the DataFrame and the parsed rows are all alive at the same
+# time.
+EAGER_PARSE_MEMORY_FACTOR = 8
+
+
+# Arrow types of the JSON schema types the arrow engine converts columns to.
+ARROW_TYPES = {"integer": "int64", "number": "float64", "boolean": "bool"}
+
+# Integers as Arrow's CSV reader reads them.
+INTEGER_PATTERN = re.compile(r"-?[0-9]+")
+
+
+# Bytes decompressed at a time when checking the CRC of an archive member.
+CRC_CHECK_BLOCK_SIZE = 1024 * 1024
+
+# Most distinct values of a column the row by row parser keeps an intern
+# table for; columns with more values (free text, IDs) are left alone.
+INTERN_MAX_DISTINCT = 1024
+
+# Most transformed values of a column the row by row parser remembers.
+TRANSFORM_CACHE_SIZE = 65536
+
+# Format of the dates in Hotjar exports, and of the timestamps derived from them.
+HOTJAR_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+ISO_UTC_FORMAT = "%Y-%m-%dT%H:%M:%S+00:00"
+
+# Rows the row by row parser converts timestamps for at once.
+TIMESTAMP_BLOCK_ROWS = 1000
+
+# Bytes decompressed at a time from a timed archive member.
+UNZIP_BUFFER_SIZE = 256 * 1024
+
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+_process_pool_lock = threading.Lock()
+
+
+class RecordBatch:
+    """Parsed rows of an export, sharing a single header.
+
+    Rows are kept as tuples and only turned into record dicts while iterating,
+    right before each record is emitted. Holding a row costs a fraction of a
+    dict repeating every (long, transliterated) question as a key, and batches
+    are cheap to pickle between processes. `tags` are added to every record.
+    """
+
+    __slots__ = ("header", "rows", "tags", "unzip_seconds")
+
+    def __init__(
+        self, header: Tuple[str, ...], rows: List[tuple], tags: Optional[dict] = None
+    ) -> None:
+        self.header = header
+        self.rows = rows
+        self.tags = tags or {}
+        # Time spent decompressing the member, when parsed in another process.
+        self.unzip_seconds = 0.0
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __iter__(self) -> Iterator[dict]:
+        header = self.header
+        tags = self.tags
+        for row in self.rows:
+            record = dict(zip(header, row))
+            record.update(tags)
+            yield record
+
+
+class RecordBatches:
+    """Record batches of several export members, iterated in turn."""
+
+    __slots__ = ("batches",)
+
+    def __init__(self, batches: List[RecordBatch]) -> None:
+        self.batches = batches
+
+    def __len__(self) -> int:
+        return sum(len(batch) for batch in self.batches)
+
+    def __iter__(self) -> Iterator[dict]:
+        for batch in self.batches:
+            yield from batch
+
+
+def frame_chunks(records: Iterable[dict], size: int) -> Iterator[pd.DataFrame]:
+    """Group parsed records into DataFrames of at most `size` rows.
+
+    Columns have `object` dtype, so values keep their type, and missing
+    values are None. Record batches are sliced without building their record
+    dicts.
+    """
+    batches = records.batches if isinstance(records, RecordBatches) else [records]
+    for batch in batches:
+        if isinstance(batch, RecordBatch):
+            for start in range(0, len(batch.rows), size):
+                df = pd.DataFrame(
+                    batch.rows[start:start + size], columns=list(batch.header), dtype=object
+                )
+                for name, value in batch.tags.items():
+                    df[name] = value
+                yield df
+            continue
+        iterator = iter(batch)
+        while True:
+            chunk = list(islice(iterator, size))
+            if not chunk:
+                break
+            # Properties some records lack are read as NaN.
+            df = pd.DataFrame(chunk, dtype=object)
+            yield df.where(df.notna(), None)
+
+
+def frame_records(df: pd.DataFrame) -> RecordBatch:
+    """Turn a DataFrame back into records, with missing values as None."""
+    columns = [_dictionary_values(df.iloc[:, index]) for index in range(df.shape[1])]
+    return RecordBatch(tuple(df.columns), list(zip(*columns)))
+
+
+def _as_number(value: Any) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class RowFilter:
+    """A predicate on one column of an export, e.g. `Country in (...)`.
+
+    Missing values never match. The ordering operators compare numerically
+    when the filter value is a number and as strings otherwise, which orders
+    Hotjar's `YYYY-MM-DD HH:MM:SS` dates correctly.
+    """
+
+    OPERATORS = ("eq", "ne", "in", "not_in", "gt", "gte", "lt", "lte")
+
+    __slots__ = ("column", "op", "value")
+
+    def __init__(self, column: str, op: str, value: Any) -> None:
+        if op not in self.OPERATORS:
+            raise ValueError(f"Unknown filter operator '{op}' on column '{column}'.")
+        if op in ("in", "not_in") and not isinstance(value, (list, tuple, set, frozenset)):
+            raise ValueError(f"Filter operator '{op}' on column '{column}' needs a list of values.")
+        self.column = column
+        self.op = op
+        self.value = frozenset(map(str, value)) if op in ("in", "not_in") else value
+
+    @classmethod
+    def from_config(cls, spec: dict) -> "RowFilter":
+        """Build a filter from a `{"column", "op", "value"}` config entry."""
+        if not isinstance(spec, dict) or "column" not in spec or "value" not in spec:
+            raise ValueError(f"Row filter {spec!r} needs a column and a value.")
+        return cls(spec["column"], spec.get("op", "eq"), spec["value"])
+
+    def __reduce__(self):
+        value = sorted(self.value) if isinstance(self.value, frozenset) else self.value
+        return (RowFilter, (self.column, self.op, value))
+
+    def matches(self, value: Optional[str]) -> bool:
+        """Return True if a single column value passes the filter."""
+        if value is None:
+            return False
+        if self.op == "in":
+            return value in self.value
+        if self.op == "not_in":
+            return value not in self.value
+        if self.op in ("eq", "ne"):
+            return (value == str(self.value)) == (self.op == "eq")
+        target = _as_number(self.value) if not isinstance(self.value, str) else None
+        if target is not None:
+            number = _as_number(value)
+            if number is None:
+                return False
+            left, right = number, target
+        else:
+            left, right = value, str(self.value)
+        if self.op == "gt":
+            return left > right
+        if self.op == "gte":
+            return left >= right
+        if self.op == "lt":
+            return left < right
+        return left <= right
+
+    def mask(self, series: pd.Series) -> pd.Series:
+        """Evaluate the filter over a whole column at once."""
+        present = series.notna()
+        if self.op == "in":
+            return present & series.isin(self.value)
+        if self.op == "not_in":
+            return present & ~series.isin(self.value)
+        if self.op == "eq":
+            return present & (series == str(self.value))
+        if self.op == "ne":
+            return present & (series != str(self.value))
+        target = _as_number(self.value) if not isinstance(self.value, str) else None
+        if target is not None:
+            left, right = pd.to_numeric(series, errors="coerce"), target
+            present = left.notna()
+        else:
+            left, right = series.where(present, ""), str(self.value)
+        if self.op == "gt":
+            return present & (left > right)
+        if self.op == "gte":
+            return present & (left >= right)
+        if self.op == "lt":
+            return present & (left < right)
+        return present & (left <= right)
+
+
+class ParseOptions(NamedTuple):
+    """How to turn an export's CSV into records.
+
+    Attributes:
+        rename: Maps a CSV header to its property name.
+        deselected: Property names that are never materialised.
+        filters: Row filters all records must pass, applied before records
+            are built.
+        member_property: Property every record gets the name of the archive
+            member it was read from in, if any.
+        transforms: `(property, transform)` pairs applied, in order, to the
+            non-missing values of a property once the rows are filtered.
+        timestamps: `(source, target)` property pairs: the Hotjar dates of
+            `source` are added to the records as ISO-8601 UTC timestamps in
+            `target`. Both properties must be selected.
+        timezone: Time zone of the Hotjar dates.
+        types: `(property, type)` pairs of the JSON schema types to convert
+            columns to, as the arrow engine does: a column with a value
+            that does not convert is kept as strings. The row by row parser
+            cannot look ahead, and keeps just that value as a string.
+    """
+
+    rename: Callable[[str], str]
+    deselected: FrozenSet[str] = frozenset()
+    filters: Tuple[RowFilter, ...] = ()
+    member_property: Optional[str] = None
+    transforms: Tuple[Tuple[str, ValueTransform], ...] = ()
+    timestamps: Tuple[Tuple[str, str], ...] = ()
+    timezone: str = "UTC"
+    types: Tuple[Tuple[str, str], ...] = ()
+
+
+def iso_timestamps(values: Sequence[Optional[str]], timezone: str) -> List[Optional[str]]:
+    """Convert Hotjar dates in `timezone` to ISO-8601 UTC timestamps, at once.
+
+    Dates that do not parse become None. A date in the repeated hour of a
+    daylight saving time change is taken as its first, summer time, instance.
+    """
+    parsed = pd.to_datetime(
+        pd.Series(values, dtype=object), format=HOTJAR_DATE_FORMAT, errors="coerce"
+    )
+    utc = parsed.dt.tz_localize(
+        timezone, ambiguous=np.ones(len(parsed), dtype=bool), nonexistent="shift_forward"
+    ).dt.tz_convert("UTC")
+    return utc.dt.strftime(ISO_UTC_FORMAT).astype(object).where(utc.notna(), None).tolist()
+
+
+def _with_timestamps(
+    header: Tuple[str, ...], rows: List[tuple], options: ParseOptions
+) -> Tuple[Tuple[str, ...], List[tuple]]:
+    # Appends the options' timestamp columns to parsed rows.
+    pairs = [(source, target) for source, target in options.timestamps if source in header]
+    if not pairs:
+        return header, rows
+    columns = [
+        iso_timestamps([row[header.index(source)] for row in rows], options.timezone)
+        for source, _ in pairs
+    ]
+    return (
+        header + tuple(target for _, target in pairs),
+        [row + extra for row, extra in zip(rows, zip(*columns))],
+    )
+
+
+def _to_integer(value: str) -> int:
+    if not INTEGER_PATTERN.fullmatch(value):
+        raise ValueError(f"invalid integer: {value!r}")
+    return int(value)
+
+
+def _to_number(value: str) -> float:
+    if value != value.strip() or "_" in value:
+        raise ValueError(f"invalid number: {value!r}")
+    return float(value)
+
+
+def _to_boolean(value: str) -> bool:
+    lowered = value.lower()
+    if lowered in ("true", "1"):
+        return True
+    if lowered in ("false", "0"):
+        return False
+    raise ValueError(f"invalid boolean: {value!r}")
+
+
+# Conversions of the JSON schema types in `ARROW_TYPES`, accepting the same
+# strings as Arrow's casts.
+CONVERTERS: Dict[str, Callable[[str], Any]] = {
+    "integer": _to_integer,
+    "number": _to_number,
+    "boolean": _to_boolean,
+}
+
+
+def _converters(header: Sequence[str], options: ParseOptions) -> List[Optional[Callable]]:
+    types = dict(options.types)
+    return [CONVERTERS.get(types.get(name, "string")) for name in header]
+
+
+def _typed_values(values: Sequence, convert: Optional[Callable]) -> Sequence:
+    # All values converted, or the values as they are if one does not convert.
+    if convert is None:
+        return values
+    try:
+        return [None if value is None else convert(value) for value in values]
+    except ValueError:
+        return values
+
+
+def _typed_rows(header: Sequence[str], rows: List[tuple], options: ParseOptions) -> List[tuple]:
+    converters = _converters(header, options)
+    if not rows or not any(converters):
+        return rows
+    columns = [_typed_values(column, convert) for column, convert in zip(zip(*rows), converters)]
+    return list(zip(*columns))
+
+
+def _typed_row_stream(
+    header: Sequence[str], rows: Iterator[tuple], options: ParseOptions
+) -> Iterator[tuple]:
+    converters = _converters(header, options)
+    if not any(converters):
+        yield from rows
+        return
+
+    def converted(value: Optional[str], convert: Optional[Callable]) -> Any:
+        if value is None or convert is None:
+            return value
+        try:
+            return convert(value)
+        except ValueError:
+            return value
+
+    for row in rows:
+        yield tuple(map(converted, row, converters))
+
+
+def _column_transforms(options: ParseOptions) -> Dict[str, ValueTransform]:
+    by_column: Dict[str, List[ValueTransform]] = {}
+    for column, transform in options.transforms:
+        by_column.setdefault(column, []).append(transform)
+    return {
+        column: transforms[0] if len(transforms) == 1 else _Chain(tuple(transforms))
+        for column, transforms in by_column.items()
+    }
+
+
+class _Chain:
+    # Picklable composition of value transforms.
+    __slots__ = ("transforms",)
+
+    def __init__(self, transforms: Tuple[ValueTransform, ...]) -> None:
+        self.transforms = transforms
+
+    def __reduce__(self):
+        return (_Chain, (self.transforms,))
+
+    def __call__(self, value: str) -> Optional[str]:
+        for transform in self.transforms:
+            if value is None:
+                return None
+            value = transform(value)
+        return value
+
+
+class _TimedReader(io.RawIOBase):
+    # Reads an archive member, adding the time spent to its archive's timer.
+
+    def __init__(self, member, archive: "TimedZipFile") -> None:
+        self._member = member
+        self._archive = archive
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        start = time.perf_counter()
+        size = self._member.readinto(buffer)
+        self._archive.add_unzip_time(time.perf_counter() - start)
+        return size
+
+    def readall(self) -> bytes:
+        start = time.perf_counter()
+        data = self._member.read()
+        self._archive.add_unzip_time(time.perf_counter() - start)
+        return data
+
+    def close(self) -> None:
+        self._member.close()
+        super().close()
+
+
+class TimedZipFile(zipfile.ZipFile):
+    """A zip archive timing the decompression of the members read from it.
+
+    The parsers read members as streams, so decompression is interleaved with
+    parsing; `unzip_seconds` adds up the time spent in the reads, from every
+    thread reading the archive.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.unzip_seconds = 0.0
+        self._unzip_lock = threading.Lock()
+
+    def add_unzip_time(self, seconds: float) -> None:
+        with self._unzip_lock:
+            self.unzip_seconds += seconds
+
+    def open(self, name, mode="r", *args: Any, **kwargs: Any):
+        member = super().open(name, mode, *args, **kwargs)
+        if mode != "r":
+            return member
+        return io.BufferedReader(_TimedReader(member, self), UNZIP_BUFFER_SIZE)
+
+
+def _member_tags(options: ParseOptions, member: zipfile.ZipInfo) -> dict:
+    return {options.member_property: member.filename} if options.member_property else {}
+
+
+def export_members(thezip: zipfile.ZipFile) -> List[zipfile.ZipInfo]:
+    """Return the archive members holding survey responses, in archive order.
+
+    These are the CSV files of the archive, or all its files if none has a
+    `.csv` extension.
+    """
+    members = [member for member in thezip.infolist() if not member.is_dir()]
+    return [member for member in members if member.filename.lower().endswith(".csv")] or members
+
+
+def export_header(
+    thezip: zipfile.ZipFile, member: zipfile.ZipInfo, options: ParseOptions
+) -> List[str]:
+    """Return the property names of a member's columns, in CSV order."""
+    with thezip.open(member) as thefile:
+        columns = next(csv.reader(io.TextIOWrapper(thefile, encoding="utf-8", newline="")), [])
+    return [options.rename(column) for column in columns]
+
+
+def missing_filter_columns(
+    thezip: zipfile.ZipFile, member: zipfile.ZipInfo, options: ParseOptions
+) -> List[str]:
+    """Return the columns filtered on that a member lacks; no row passes their filters."""
+    names = set(export_header(thezip, member, options)) if options.filters else set()
+    return sorted({row_filter.column for row_filter in options.filters} - names)
+
+
+def verify_members(
+    thezip: zipfile.ZipFile,
+    members: List[zipfile.ZipInfo],
+    archive_size: int,
+    check_crc: bool = False,
+) -> None:
+    """Fail fast on a truncated or corrupt export.
+
+    Checks that the compressed data of every member lies within the archive.
+    With `check_crc`, also decompresses the members, concurrently, and checks
+    their size and CRC, which parsers reading a member as a stream would only
+    notice after emitting its records. Raises `zipfile.BadZipFile`.
+    """
+    for member in members:
+        if member.header_offset + member.compress_size > archive_size:
+            raise zipfile.BadZipFile(
+                f"{member.filename} is truncated: {member.compress_size} compressed "
+                f"bytes at offset {member.header_offset} of a {archive_size} byte archive"
+            )
+    if not check_crc:
+        return
+
+    def check(member: zipfile.ZipInfo) -> None:
+        size = 0
+        # Reading to the end makes zipfile check the CRC.
+        with thezip.open(member) as thefile:
+            for block in iter(lambda: thefile.read(CRC_CHECK_BLOCK_SIZE), b""):
+                size += len(block)
+        if size != member.file_size:
+            raise zipfile.BadZipFile(
+                f"{member.filename} has {size} bytes instead of {member.file_size}"
+            )
+
+    with ThreadPoolExecutor(len(members) or 1, thread_name_prefix="hotjar-crc") as pool:
+        list(pool.map(check, members))
+
+
+def estimate_eager_parse_bytes(members: List[zipfile.ZipInfo]) -> int:
+    """Estimate the peak memory needed to parse `members` eagerly."""
+    return sum(member.file_size for member in members) * EAGER_PARSE_MEMORY_FACTOR
+
+
+def read_export(
+    thezip: zipfile.ZipFile, member: zipfile.ZipInfo, options: ParseOptions
+) -> RecordBatch:
+    """Parse a whole export member at once with pandas.
+
+    Deselected columns are skipped by the CSV reader and never materialised,
+    unless a filter needs them.
+    """
+    with thezip.open(member) as thefile:
+        text = io.StringIO(thefile.read().decode("utf-8"))
+    return _frame_batch(_read_csv(text, options), options, _member_tags(options, member))
+
+
+def iter_export_chunks(
+    thezip: zipfile.ZipFile, member: zipfile.ZipInfo, options: ParseOptions, chunk_size: int
+) -> Iterator[RecordBatch]:
+    """Parse an export member with pandas, `chunk_size` rows at a time.
+
+    The member is decompressed as it is read, so memory depends on the chunk
+    size rather than on the size of the export.
+    """
+    with thezip.open(member) as thefile:
+        text = io.TextIOWrapper(thefile, encoding="utf-8", newline="")
+        for chunk in _read_csv(text, options, chunksize=chunk_size):
+            yield _frame_batch(chunk, options, _member_tags(options, member))
+
+
+def _read_csv(text, options: ParseOptions, **kwargs):
+    rename, deselected, filters = options.rename, options.deselected, options.filters
+    filtered = {row_filter.column for row_filter in filters}
+    return pd.read_csv(
+        text,
+        dtype=object,
+        usecols=lambda column: rename(column) not in deselected or rename(column) in filtered,
+        **kwargs,
+    )
+
+
+def _frame_batch(df: pd.DataFrame, options: ParseOptions, tags: dict) -> RecordBatch:
+    rename, deselected, filters = options.rename, options.deselected, options.filters
+    df = df.rename(columns={column: rename(column) for column in df.columns})
+    if filters:
+        keep = pd.Series(True, index=df.index)
+        for row_filter in filters:
+            if row_filter.column not in df.columns:
+                keep &= False
+            else:
+                keep &= row_filter.mask(df[row_filter.column])
+        filtered = {row_filter.column for row_filter in filters}
+        df = df[keep].drop(columns=[column for column in df.columns if column in filtered & deselected])
+    transforms = _column_transforms(options)
+    header = tuple(df.columns)
+    columns = [
+        _dictionary_values(df.iloc[:, index], transforms.get(name), convert)
+        for index, (name, convert) in enumerate(zip(header, _converters(header, options)))
+    ]
+    for source, target in options.timestamps:
+        if source in header:
+            columns.append(iso_timestamps(df[source].tolist(), options.timezone))
+            header += (target,)
+    return RecordBatch(header, list(zip(*columns)), tags)
+
+
+def _dictionary_values(
+    series: pd.Series,
+    transform: Optional[ValueTransform] = None,
+    convert: Optional[Callable] = None,
+) -> list:
+    # A single object per distinct value: categorical columns such as the
+    # country or device repeat a handful of values over the whole export.
+    # Transforms and type conversions also only run once per distinct value.
+    codes, uniques = pd.factorize(series.to_numpy(dtype=object))
+    if transform:
+        uniques = [transform(value) for value in uniques]
+    return _decode(_typed_values(np.asarray(uniques, dtype=object), convert), codes)
+
+
+def _decode(dictionary: Sequence, codes: np.ndarray) -> list:
+    # Missing values have the code -1, which picks the trailing None.
+    lookup = np.empty(len(dictionary) + 1, dtype=object)
+    lookup[:-1] = dictionary
+    return lookup[codes].tolist()
+
+
+def _interned(table: dict, value: Optional[str]) -> Optional[str]:
+    if value is None:
+        return None
+    known = table.get(value)
+    if known is not None:
+        return known
+    if len(table) < INTERN_MAX_DISTINCT:
+        table[value] = value
+    return value
+
+
+def _csv_rows(
+    thefile, options: ParseOptions, intern: bool = False
+) -> Tuple[Sequence[str], Iterator[tuple]]:
+    # With `intern`, repeated values of a column share a single object, which
+    # only pays off when the rows are all kept.
+    rename, deselected, filters = options.rename, options.deselected, options.filters
+    reader = csv.reader(io.TextIOWrapper(thefile, encoding="utf-8", newline=""))
+    names = [rename(column) for column in next(reader, [])]
+    columns = [(index, name) for index, name in enumerate(names) if name not in deselected]
+    header = tuple(name for _, name in columns)
+    indexes = [index for index, _ in columns]
+    checks = [
+        (names.index(row_filter.column) if row_filter.column in names else None, row_filter)
+        for row_filter in filters
+    ]
+    transforms = _column_transforms(options)
+    memos = [
+        lru_cache(TRANSFORM_CACHE_SIZE)(transforms[name]) if name in transforms else None
+        for name in header
+    ]
+    transformed = any(memos)
+
+    def value(row: List[str], index: Optional[int]) -> Optional[str]:
+        # Missing trailing fields are read as missing values, as pandas does.
+        if index is None or index >= len(row) or row[index] in PANDAS_NA_VALUES:
+            return None
+        return row[index]
+
+    def rows() -> Iterator[tuple]:
+        for row in reader:
+            if not row:
+                continue
+            if checks and not all(
+                row_filter.matches(value(row, index)) for index, row_filter in checks
+            ):
+                continue
+            values = tuple(value(row, index) for index in indexes)
+            if transformed:
+                values = tuple(
+                    item if memo is None or item is None else memo(item)
+                    for item, memo in zip(values, memos)
+                )
+            yield values
+
+    def interned_rows() -> Iterator[tuple]:
+        tables = [{} for _ in indexes]
+        for row in rows():
+            yield tuple(map(_interned, tables, row))
+
+    return header, interned_rows() if intern else rows()
+
+
+def iter_export(
+    thezip: zipfile.ZipFile, member: zipfile.ZipInfo, options: ParseOptions
+) -> Iterator[dict]:
+    """Parse an export member row by row, holding a single row in memory.
+
+    Timestamps are converted a block of `TIMESTAMP_BLOCK_ROWS` rows at a time.
+    """
+    tags = _member_tags(options, member)
+    with thezip.open(member) as thefile:
+        header, rows = _csv_rows(thefile, options)
+        rows = _typed_row_stream(header, rows, options)
+        if options.timestamps:
+            csv_rows = rows
+            blocks = iter(lambda: list(islice(csv_rows, TIMESTAMP_BLOCK_ROWS)), [])
+            rows = (
+                row
+                for block in blocks
+                for row in _with_timestamps(header, block, options)[1]
+            )
+            header = _with_timestamps(header, [], options)[0]
+        for row in rows:
+            record = dict(zip(header, row))
+            record.update(tags)
+            yield record
+
+
+def parse_export_batch(
+    surveys_zip_bin: bytes, options: ParseOptions, member_name: str
+) -> RecordBatch:
+    """Parse one member of a zipped export into a record batch.
+
+    Runs in the process pool, so it takes and returns picklable values only.
+    """
+    with TimedZipFile(io.BytesIO(surveys_zip_bin)) as thezip:
+        member = thezip.getinfo(member_name)
+        with thezip.open(member) as thefile:
+            header, rows = _csv_rows(thefile, options, intern=True)
+            rows = _typed_rows(header, list(rows), options)
+            header, rows = _with_timestamps(header, rows, options)
+        batch = RecordBatch(header, rows, _member_tags(options, member))
+        batch.unzip_seconds = thezip.unzip_seconds
+        return batch
+
+
+def arrow_available() -> bool:
+    """Return True if pyarrow, needed by the arrow engine, is installed."""
+    try:
+        import pyarrow.csv  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def concat_tables(tables: list):
+    """Concatenate Arrow tables, adding null columns for the columns some lack.
+
+    Requires pyarrow.
+    """
+    import pyarrow as pa
+
+    if len(tables) == 1:
+        return tables[0]
+    try:
+        return pa.concat_tables(tables, promote_options="default")
+    except TypeError:
+        # pyarrow < 14.
+        return pa.concat_tables(tables, promote=True)
+
+
+def read_export_table(
+    thezip: zipfile.ZipFile,
+    member: zipfile.ZipInfo,
+    options: ParseOptions,
+    types: Dict[str, str],
+):
+    """Parse a whole export member into an Arrow table.
+
+    Uses pyarrow's multithreaded CSV reader. Columns are converted to the JSON
+    schema type in `types`, by property name; a column that does not convert
+    cleanly is kept as strings. Requires pyarrow.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+
+    deselected, filters = options.deselected, options.filters
+    names = export_header(thezip, member, options)
+    wanted = {row_filter.column for row_filter in filters} | {
+        name for name in names if name not in deselected
+    }
+    with thezip.open(member) as thefile:
+        table = pa_csv.read_csv(
+            thefile,
+            read_options=pa_csv.ReadOptions(use_threads=True, autogenerate_column_names=True),
+            parse_options=pa_csv.ParseOptions(newlines_in_values=True, ignore_empty_lines=True),
+            convert_options=pa_csv.ConvertOptions(
+                include_columns=[f"f{index}" for index, name in enumerate(names) if name in wanted],
+                column_types={f"f{index}": pa.string() for index in range(len(names))},
+                null_values=list(PANDAS_NA_VALUES),
+                strings_can_be_null=True,
+                quoted_strings_can_be_null=True,
+            ),
+        )
+    # The header was read as a row, since column names may repeat.
+    table = table.rename_columns([names[int(column[1:])] for column in table.column_names])
+    table = table.slice(1)
+    for row_filter in filters:
+        if row_filter.column in table.column_names:
+            column = table.column(row_filter.column).to_pylist()
+            table = table.filter(pa.array([row_filter.matches(value) for value in column]))
+        else:
+            table = table.slice(0, 0)
+
+    transforms = _column_transforms(options)
+    header = []
+    arrays = []
+    for name, column in zip(table.column_names, table.columns):
+        if name in deselected:
+            continue
+        if name in transforms:
+            # Transform the distinct values only.
+            encoded = column.combine_chunks().dictionary_encode()
+            dictionary = [transforms[name](value) for value in encoded.dictionary.to_pylist()]
+            column = pa.DictionaryArray.from_arrays(
+                encoded.indices, pa.array(dictionary, pa.string())
+            ).dictionary_decode()
+        arrow_type = ARROW_TYPES.get(types.get(name, "string"))
+        if arrow_type:
+            try:
+                column = column.cast(arrow_type)
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+                pass
+        header.append(name)
+        arrays.append(column)
+    for source, target in options.timestamps:
+        if source in header:
+            parsed = pc.strptime(
+                arrays[header.index(source)],
+                format=HOTJAR_DATE_FORMAT,
+                unit="s",
+                error_is_null=True,
+            )
+            local = pc.assume_timezone(
+                parsed, timezone=options.timezone, ambiguous="earliest", nonexistent="latest"
+            )
+            header.append(target)
+            arrays.append(local.cast(pa.timestamp("s", tz="UTC")))
+    if options.member_property:
+        header.append(options.member_property)
+        arrays.append(pa.array([member.filename] * table.num_rows, pa.string()))
+    return pa.Table.from_arrays(arrays, names=header)
+
+
+def read_export_arrow(
+    thezip: zipfile.ZipFile,
+    member: zipfile.ZipInfo,
+    options: ParseOptions,
+    types: Dict[str, str],
+) -> RecordBatch:
+    """Parse a whole export member with Arrow, see `read_export_table`."""
+    table = read_export_table(thezip, member, options, types)
+    return RecordBatch(
+        tuple(table.column_names), list(zip(*map(_arrow_values, table.columns)))
+    )
+
+
+def _arrow_values(column) -> list:
+    import pyarrow.types as pa_types
+
+    # Going through numpy is several times faster than `to_pylist()`, but
+    # reads missing numbers as NaN, and integers with gaps as floats.
+    if pa_types.is_timestamp(column.type):
+        import pyarrow.compute as pc
+
+        column = pc.strftime(column, format=ISO_UTC_FORMAT)
+    if column.null_count and pa_types.is_integer(column.type):
+        return column.to_pylist()
+    if pa_types.is_string(column.type):
+        encoded = column.combine_chunks().dictionary_encode()
+        return _decode(
+            encoded.dictionary.to_numpy(zero_copy_only=False),
+            encoded.indices.fill_null(-1).to_numpy(zero_copy_only=False),
+        )
+    values = column.to_numpy(zero_copy_only=False).tolist()
+    if column.null_count:
+        for index in column.is_null().to_numpy(zero_copy_only=False).nonzero()[0].tolist():
+            values[index] = None
+    return values
+
+
+def process_pool(workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """Return the process pool parsing large exports, starting it if needed.
+
+    Workers are spawned rather than forked, since the export pipeline may have
+    threads running when the pool starts.
+    """
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(
+                workers or None, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _process_pool
+
+
+def shutdown_process_pool() -> None:
+    """Stop the process pool, if it was started."""
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is not None:
+            _process_pool.shutdown()
+            _process_pool = None
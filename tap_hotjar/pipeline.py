@@ -0,0 +1,109 @@
+"""Pipelined export, download and parsing of survey streams."""
+
+import contextvars
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List
+
+from tap_hotjar.streams import SurveysStream
+
+
+class ExportPipeline:
+    """Prefetches survey exports while earlier streams are being emitted.
+
+    The pipeline has three stages:
+
+    - an I/O pool requesting the server side exports and downloading them,
+    - a parse pool decompressing and parsing the downloaded zips,
+    - the caller, which emits the records of one stream at a time.
+
+    Streams are handed to the caller in the order their records become ready,
+    so a slow export never holds up the emission of the others. At most
+    `max_pending` streams are between the start of their export and the end
+    of their emission, which bounds the memory held by downloaded zips and
+    parsed records and makes the I/O stage wait for the emitter.
+
+    The time spent on a stream in the pool threads is added to its `total`
+    timer, as its `sync` timer only covers the emission.
+    """
+
+    def __init__(
+        self,
+        streams: List[SurveysStream],
+        io_workers: int,
+        parse_workers: int = 1,
+        max_pending: int = 0,
+    ) -> None:
+        self.streams = streams
+        self.io_workers = io_workers
+        self.parse_workers = parse_workers
+        self.max_pending = max_pending or io_workers * 2
+
+    def run(self) -> Iterator[SurveysStream]:
+        """Yield streams as soon as their records are ready to be emitted.
+
+        Each yielded stream has its `prefetched_records` set; the next stream
+        is only taken from the queue once the caller has synced it. An error in
+        any stage is raised here when the failed stream's turn comes.
+        """
+        ready: "queue.Queue" = queue.Queue()
+        slots = threading.Semaphore(self.max_pending)
+        stopped = threading.Event()
+        io_pool = ThreadPoolExecutor(self.io_workers, thread_name_prefix="hotjar-io")
+        parse_pool = ThreadPoolExecutor(
+            self.parse_workers, thread_name_prefix="hotjar-parse"
+        )
+
+        def parse(stream: SurveysStream, surveys_zip_bin: bytes) -> None:
+            try:
+                with stream.metrics.stage("total"):
+                    records = stream.parse_export(surveys_zip_bin)
+                ready.put((stream, records))
+            except BaseException as ex:
+                ready.put((stream, ex))
+
+        def fetch(stream: SurveysStream, queued_at: float) -> None:
+            if stopped.is_set():
+                return
+            try:
+                stream.record_stage("queue", time.perf_counter() - queued_at)
+                with stream.tracer.span("prefetch", **stream.metric_tags):
+                    with stream.metrics.stage("total"):
+                        surveys_zip_bin = stream.fetch_export()
+                    parse_pool.submit(
+                        contextvars.copy_context().run, parse, stream, surveys_zip_bin
+                    )
+            except BaseException as ex:
+                ready.put((stream, ex))
+
+        def dispatch(context: contextvars.Context) -> None:
+            for stream in self.streams:
+                slots.acquire()
+                if stopped.is_set():
+                    return
+                io_pool.submit(context.copy().run, fetch, stream, time.perf_counter())
+
+        dispatcher = threading.Thread(
+            target=dispatch,
+            args=(contextvars.copy_context(),),
+            name="hotjar-dispatch",
+            daemon=True,
+        )
+        dispatcher.start()
+        try:
+            for _ in self.streams:
+                stream, result = ready.get()
+                if isinstance(result, BaseException):
+                    raise result
+                stream.prefetched_records = result
+                yield stream
+                slots.release()
+        finally:
+            stopped.set()
+            for _ in self.streams:
+                slots.release()
+            dispatcher.join()
+            io_pool.shutdown(wait=True)
+            parse_pool.shutdown(wait=True)
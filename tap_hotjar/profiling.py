@@ -0,0 +1,62 @@
+"""Optional cProfile instrumentation of stream syncs.
+
+A profiler only sees the thread that enabled it. With `concurrent_exports`,
+the exports, downloads and eager parses run in the pipeline's pool threads
+before a stream is synced, so its profile only covers the emission of its
+records (and lazy parsing); their time shows up in the trace spans and stage
+metrics instead.
+"""
+
+import cProfile
+import io
+import pstats
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+SUMMARY_FILENAME = "summary.txt"
+
+
+@contextmanager
+def profile_to(path: Path) -> Iterator[None]:
+    """Profile the wrapped block and dump the stats to `path`."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(str(path))
+
+
+def stream_profile_path(profile_dir: str, stream_name: str) -> Path:
+    """Return where the profile of `stream_name` is written."""
+    return Path(profile_dir) / f"{stream_name}.prof"
+
+
+def write_profile_summary(
+    profile_dir: str, stream_names: Iterable[str], top: int = 50
+) -> Optional[Path]:
+    """Merge the profiles of `stream_names` into a text summary.
+
+    The summary lists the `top` functions by cumulative time over the whole
+    run, followed by the same ranking by internal time.
+    """
+    profiles = [
+        path
+        for path in (stream_profile_path(profile_dir, name) for name in stream_names)
+        if path.exists()
+    ]
+    if not profiles:
+        return None
+    buffer = io.StringIO()
+    stats = pstats.Stats(str(profiles[0]), stream=buffer)
+    for profile in profiles[1:]:
+        stats.add(str(profile))
+    buffer.write(f"Merged {len(profiles)} stream profiles from {profile_dir}\n")
+    stats.sort_stats("cumulative").print_stats(top)
+    stats.sort_stats("tottime").print_stats(top)
+    summary = Path(profile_dir) / SUMMARY_FILENAME
+    summary.write_text(buffer.getvalue(), encoding="utf-8")
+    return summary
@@ -0,0 +1,136 @@
+"""Sharding and ordering of the survey streams of a sync run."""
+
+import datetime
+import hashlib
+import json
+import os
+import statistics
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+# Stages whose durations are kept in the runtime stats file.
+RECORDED_STAGES = ("export", "download", "parse", "sync", "total")
+
+
+def expected_seconds(entry: dict) -> Optional[float]:
+    """Return the run time of a stream's runtime stats entry.
+
+    That is the `total` time spent on the stream, in the pipeline's pool
+    threads as well, or the `sync` time of entries recorded without it.
+    """
+    return entry.get("total", entry.get("sync"))
+
+
+def synced_at(entry: dict) -> datetime.datetime:
+    """Return when a runtime stats entry was recorded, naive times being UTC."""
+    moment = datetime.datetime.fromisoformat(entry["synced_at"])
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=datetime.timezone.utc)
+    return moment
+
+
+def stable_hash(name: str) -> int:
+    """Return a hash of `name` that is the same in every process and release."""
+    return int.from_bytes(hashlib.sha1(name.encode("utf-8")).digest()[:8], "big")
+
+
+def assign_shards(
+    names: Iterable[str],
+    shard_count: int,
+    weights: Optional[Dict[str, float]] = None,
+) -> Dict[str, int]:
+    """Split stream names into `shard_count` disjoint shards.
+
+    Without weights each stream goes to the shard given by a stable hash of its
+    name, so adding or removing a survey never moves the others. With weights
+    (e.g. past runtimes in seconds) the heaviest streams are spread first,
+    each onto the currently lightest shard. Streams without a weight count as
+    the median weight. Every process given the same names and weights computes
+    the same assignment.
+    """
+    names = sorted(set(names))
+    if not weights:
+        return {name: stable_hash(name) % shard_count for name in names}
+
+    default = statistics.median(weights.values())
+    loads = [0.0] * shard_count
+    assignment = {}
+    for name in sorted(
+        names, key=lambda name: (-weights.get(name, default), stable_hash(name))
+    ):
+        shard = min(range(shard_count), key=lambda index: (loads[index], index))
+        assignment[name] = shard
+        loads[shard] += weights.get(name, default)
+    return assignment
+
+
+def read_weights(path: str) -> Dict[str, float]:
+    """Read a JSON file mapping stream names to weights.
+
+    A runtime stats file can be used as well, weighting each stream by its last
+    recorded run time (see `expected_seconds`). Every process of a sharded run must read the same
+    weights, so give them all a copy of the same file.
+    """
+    weights = {}
+    for name, weight in json.loads(Path(path).read_text(encoding="utf-8")).items():
+        if isinstance(weight, dict):
+            weight = expected_seconds(weight)
+            if weight is None:
+                continue
+        weights[name] = float(weight)
+    return weights
+
+
+def read_runtime_stats(path: str) -> Dict[str, dict]:
+    """Read the runtime stats file, or return no stats if there is none yet."""
+    try:
+        return json.loads(Path(path).read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return {}
+
+
+def write_runtime_stats(path: str, updates: Dict[str, dict]) -> None:
+    """Merge `updates` into the runtime stats file.
+
+    The file is re-read right before writing so that entries of streams synced
+    by other processes sharing it are kept.
+    """
+    stats = read_runtime_stats(path)
+    stats.update(updates)
+    target = Path(path)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(stats, indent=2, sort_keys=True), encoding="utf-8")
+    os.replace(tmp, target)
+
+
+def runtime_entry(timers: Dict[str, float], now: datetime.datetime) -> dict:
+    """Build the runtime stats entry of a stream from its stage timers."""
+    entry = {stage: round(timers[stage], 3) for stage in RECORDED_STAGES if stage in timers}
+    entry["synced_at"] = now.isoformat()
+    return entry
+
+
+def schedule_order(
+    names: Iterable[str],
+    stats: Dict[str, dict],
+    now: datetime.datetime,
+    stale_after: datetime.timedelta,
+) -> List[str]:
+    """Order stream names so the longest expected syncs start first.
+
+    The expected duration is the last recorded run time, boosted by one more
+    multiple for every `stale_after` since the stream last synced, so surveys
+    that keep being skipped or failing move up. Streams that have never been
+    synced have an unknown size and are started before all others.
+    """
+    def priority(name: str) -> tuple:
+        entry = stats.get(name)
+        seconds = expected_seconds(entry) if entry else None
+        if seconds is None:
+            return (0, 0.0, name)
+        age = now - synced_at(entry)
+        boost = 1 + max(age / stale_after, 0)
+        return (1, -seconds * boost, name)
+
+    return sorted(names, key=priority)
@@ -0,0 +1,167 @@
+"""Local staging store of emitted responses, to emit only what changed."""
+
+import hashlib
+import json
+import sqlite3
+from itertools import islice
+from typing import Any, Callable, Iterable, Iterator, List
+
+# Property marking a record as deleted, as Singer targets expect it.
+DELETED_AT_PROPERTY = "_sdc_deleted_at"
+
+# Records hashed and compared against the store per SQL round trip.
+DIFF_BATCH_SIZE = 10000
+
+# Seconds to wait for another process's commit to the store.
+LOCK_TIMEOUT = 60.0
+
+
+def row_hash(record: dict, key: str) -> bytes:
+    """Return the hash of a record's values, leaving out its key and `_sdc_` properties."""
+    values = {
+        name: value
+        for name, value in record.items()
+        if name != key and not name.startswith("_sdc_")
+    }
+    text = json.dumps(values, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+class StagingStore:
+    """Row hashes of the responses emitted so far, in a SQLite database.
+
+    Rows are keyed by stream and response `Number`, as streams of the same
+    survey may select or filter other responses. Each export is diffed against
+    the store in batches of `DIFF_BATCH_SIZE` records. The new hashes are
+    staged in temporary tables of the connection and only written on
+    `commit()`, once the records have been emitted, so a failed sync emits the
+    same changes again on the next run.
+
+    The shared database is only locked by the short write transaction of
+    `commit()`, so the processes of a sharded run can share one store; a
+    process waits up to `timeout` seconds for another's commit.
+    """
+
+    def __init__(self, path: str, key: str = "Number", timeout: float = LOCK_TIMEOUT) -> None:
+        self.key = key
+        self.connection = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+        self.connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                stream TEXT NOT NULL,
+                number TEXT NOT NULL,
+                hash BLOB NOT NULL,
+                PRIMARY KEY (stream, number)
+            ) WITHOUT ROWID;
+            CREATE TEMP TABLE IF NOT EXISTS batch (number TEXT PRIMARY KEY, hash BLOB);
+            CREATE TEMP TABLE IF NOT EXISTS staged (
+                stream TEXT, number TEXT, hash BLOB, PRIMARY KEY (stream, number)
+            );
+            CREATE TEMP TABLE IF NOT EXISTS seen (stream TEXT, number TEXT, PRIMARY KEY (stream, number));
+            CREATE TEMP TABLE IF NOT EXISTS gone (stream TEXT, number TEXT, PRIMARY KEY (stream, number));
+            """
+        )
+
+    def changes(self, stream: str, records: Iterable[dict]) -> Iterator[dict]:
+        """Yield the records that are new or changed since the last commit.
+
+        Records without a key are always yielded. The keys seen are kept until
+        `deleted()` is called, to find the responses missing from the export.
+        """
+        records = iter(records)
+        while True:
+            batch = list(islice(records, DIFF_BATCH_SIZE))
+            if not batch:
+                return
+            hashes = {}
+            for record in batch:
+                number = record.get(self.key)
+                if number is not None:
+                    hashes[str(number)] = row_hash(record, self.key)
+            changed = self._diff(stream, hashes)
+            for record in batch:
+                number = record.get(self.key)
+                if number is None or str(number) in changed:
+                    yield record
+
+    def _diff(self, stream: str, hashes: dict) -> set:
+        # Returns the keys whose hash differs from the stored or staged one, and
+        # stages their new hashes.
+        cursor = self.connection.cursor()
+        cursor.execute("DELETE FROM batch")
+        cursor.executemany("INSERT OR REPLACE INTO batch VALUES (?, ?)", hashes.items())
+        cursor.execute("INSERT OR IGNORE INTO seen SELECT ?, number FROM batch", (stream,))
+        changed = {
+            number
+            for number, in cursor.execute(
+                "SELECT batch.number FROM batch"
+                " LEFT JOIN staged ON staged.stream = ? AND staged.number = batch.number"
+                " LEFT JOIN responses ON responses.stream = ? AND responses.number = batch.number"
+                " WHERE coalesce(staged.hash, responses.hash) IS NOT batch.hash",
+                (stream, stream),
+            )
+        }
+        cursor.executemany(
+            "INSERT OR REPLACE INTO staged VALUES (?, ?, ?)",
+            ((stream, number, hashes[number]) for number in changed),
+        )
+        return changed
+
+    def deleted(self, stream: str) -> List[str]:
+        """Return the keys of the stream's responses missing from the export.
+
+        They are forgotten on `commit()`.
+        """
+        cursor = self.connection.cursor()
+        missing = [
+            number
+            for number, in cursor.execute(
+                "SELECT number FROM responses WHERE stream = ?"
+                " AND number NOT IN (SELECT number FROM seen WHERE stream = ?)",
+                (stream, stream),
+            )
+        ]
+        cursor.executemany(
+            "INSERT OR IGNORE INTO gone VALUES (?, ?)", ((stream, number) for number in missing)
+        )
+        cursor.execute("DELETE FROM seen WHERE stream = ?", (stream,))
+        return missing
+
+    def deletion_markers(
+        self, stream: str, deleted_at: str, key_type: Callable[[str], Any] = str
+    ) -> Iterator[dict]:
+        """Yield a record marking each missing response as deleted.
+
+        Keys are stored as strings; `key_type` converts them to the records' type.
+        """
+        for number in self.deleted(stream):
+            yield {self.key: key_type(number), DELETED_AT_PROPERTY: deleted_at}
+
+    def commit(self) -> None:
+        """Write the hashes staged since the last commit, in one transaction."""
+        cursor = self.connection.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            cursor.execute("INSERT OR REPLACE INTO responses SELECT stream, number, hash FROM staged")
+            cursor.execute(
+                "DELETE FROM responses WHERE EXISTS (SELECT 1 FROM gone"
+                " WHERE gone.stream = responses.stream AND gone.number = responses.number)"
+            )
+        except BaseException:
+            cursor.execute("ROLLBACK")
+            raise
+        cursor.execute("COMMIT")
+        self.rollback()
+
+    def rollback(self) -> None:
+        """Forget the hashes staged since the last commit."""
+        self.connection.executescript("DELETE FROM staged; DELETE FROM gone; DELETE FROM seen;")
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def __enter__(self) -> "StagingStore":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
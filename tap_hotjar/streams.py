@@ -1,16 +1,103 @@
 """Stream type classes for tap-hotjar."""
+import datetime
 import requests
 import io
-import zipfile
-import pandas as pd
+import time
 import json
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from itertools import chain
 from unidecode import unidecode
 from pathlib import Path
-from typing import Any, Dict, Optional, Union, List, Iterable
+from typing import Any, Callable, Dict, FrozenSet, Iterator, Optional, Tuple, Union, List, Iterable
+
+import pandas as pd
+from urllib.parse import quote
 from singer_sdk.helpers.jsonpath import extract_jsonpath
 from singer_sdk import typing as th  # JSON Schema typing helpers
 
 from tap_hotjar.client import HotJarStream
+from tap_hotjar.bitmap import (
+    decode_runs,
+    encode_runs,
+    number_runs,
+    run_count,
+    run_numbers,
+    runs_difference,
+    runs_gaps,
+)
+from tap_hotjar.parquet import write_partitions
+from tap_hotjar.staging import DELETED_AT_PROPERTY, StagingStore
+from tap_hotjar.transforms import ValueTransform, pii_transform, text_normalizer
+from tap_hotjar.parsing import (
+    CONVERTERS,
+    arrow_available,
+    concat_tables,
+    estimate_eager_parse_bytes,
+    export_members,
+    frame_chunks,
+    frame_records,
+    iter_export,
+    iter_export_chunks,
+    missing_filter_columns,
+    parse_export_batch,
+    process_pool,
+    read_export,
+    read_export_arrow,
+    read_export_table,
+    verify_members,
+    ParseOptions,
+    RecordBatches,
+    RowFilter,
+    TimedZipFile,
+)
+
+# Property holding the name of the export archive member a record was read from.
+EXPORT_MEMBER_PROPERTY = "_sdc_export_member"
+
+# Property holding `Date Submitted` as an ISO-8601 UTC timestamp.
+SUBMITTED_AT_PROPERTY = "submitted_at"
+
+# Stream state key of the encoded runs of response numbers seen so far.
+SEEN_NUMBERS_STATE_KEY = "seen_numbers"
+
+# Properties describing a response rather than answering a survey question.
+RESPONSE_METADATA_PROPERTIES = frozenset([
+    "Number",
+    "User",
+    "Date Submitted",
+    "Country",
+    "Source URL",
+    "Device",
+    "Browser",
+    "OS",
+    "Hotjar User ID",
+    "User ID",
+    "ICMCustomerID",
+    "ICMUserID",
+    EXPORT_MEMBER_PROPERTY,
+    SUBMITTED_AT_PROPERTY,
+    DELETED_AT_PROPERTY,
+])
+
+# Export columns that Hotjar's `survey_query` clauses can filter on, and the
+# field names the clauses use for them.
+EXPORT_QUERY_FIELDS = {
+    "Country": "country",
+    "Device": "device",
+    "Date Submitted": "created",
+}
+EXPORT_QUERY_COMPARISONS = {
+    "eq": "equal",
+    "ne": "not_equal",
+    "in": "in",
+    "not_in": "not_in",
+    "gt": "greater_than",
+    "gte": "greater_than_or_equal",
+    "lt": "less_than",
+    "lte": "less_than_or_equal",
+}
 
 
 class HotJarApiError(Exception):
@@ -42,26 +129,460 @@ class SurveysStream(HotJarStream):
         th.Property(clean("Êtes-vous satisfaits de votre visite :"), th.NumberType),
     ).to_dict()
 
+    # Set by the export pipeline when the records were parsed ahead of the sync.
+    prefetched_records: Optional[Iterable[dict]] = None
+
+    # Open while the stream is synced with a `staging_db`.
+    staging: Optional[StagingStore] = None
+
+    # Most rows in a chunk passed to `post_process_batch`.
+    POST_PROCESS_BATCH_SIZE = 10000
+
+    def __init__(self, *args, **kwargs) -> None:
+        # Every survey's records say which member of the export they come from,
+        # and when they were submitted, in a form warehouses load as timestamps.
+        # Deletion markers have a deletion time instead.
+        self.schema = {
+            **self.schema,
+            "properties": {
+                **self.schema["properties"],
+                EXPORT_MEMBER_PROPERTY: {"type": ["string", "null"]},
+                SUBMITTED_AT_PROPERTY: {
+                    "type": ["string", "null"],
+                    "format": "date-time",
+                },
+                DELETED_AT_PROPERTY: {
+                    "type": ["string", "null"],
+                    "format": "date-time",
+                },
+            },
+        }
+        super().__init__(*args, **kwargs)
+
     @property
     def path(self): 
-        return f"/ask/v3/sites/{self.site_id}/polls/{self.survey_id}/responses/export?survey_query=%7B%22sort_by%22:%22-index%22,%22clauses%22:[]%7D&format=csv&async_export=false"
+        return f"/ask/v3/sites/{self.site_id}/polls/{self.survey_id}/responses/export?survey_query={self.survey_query}&format=csv&async_export=false"
+
+    @property
+    def survey_query(self) -> str:
+        """The URL encoded `survey_query` of the export request.
+
+        With `push_filters_to_export`, the row filters Hotjar can apply itself
+        are sent as query clauses so the export only holds matching rows.
+        """
+        clauses = []
+        if self.config.get("push_filters_to_export"):
+            for row_filter in self.row_filters:
+                if row_filter.column in EXPORT_QUERY_FIELDS:
+                    value = row_filter.value
+                    clauses.append({
+                        "key": EXPORT_QUERY_FIELDS[row_filter.column],
+                        "comparison": EXPORT_QUERY_COMPARISONS[row_filter.op],
+                        "value": sorted(value) if isinstance(value, frozenset) else value,
+                    })
+        query = json.dumps({"sort_by": "-index", "clauses": clauses}, separators=(",", ":"))
+        return quote(query, safe=":,[]")
+
+    @property
+    def row_filters(self) -> Tuple[RowFilter, ...]:
+        """Row filters configured for this stream and for all streams (`*`)."""
+        stream_filters = self.config.get("stream_filters") or {}
+        return tuple(
+            RowFilter.from_config(spec)
+            for spec in [*stream_filters.get("*", []), *stream_filters.get(self.name, [])]
+        )
+
+    @property
+    def metric_tags(self) -> Dict[str, Any]:
+        return {**super().metric_tags, "site_id": self.site_id, "survey_id": self.survey_id}
 
     def parse_response(self, response: requests.Response) -> Iterable[dict]:
         """Parse the response and return an iterator of result records."""
+        surveys_zip_bin = self.download_export(response)
+        yield from self.metrics.timed_emit(self.parse_export(surveys_zip_bin))
+
+    def request_records(self, context: Optional[dict]) -> Iterable[dict]:
+        """Export, download and parse the survey, then emit its records.
+
+        Emits the records prefetched by the export pipeline instead, if any.
+        With a staging store, only emits the new and changed records.
+        """
+        records, self.prefetched_records = self.prefetched_records, None
+        if records is None:
+            records = self.parse_export(self.fetch_export(context))
+        if self.has_batch_post_process:
+            records = self.post_process_batches(records, context)
+        numbers: List[int] = []
+        track_seen = self.tracks_seen_responses
+        if track_seen:
+            records = self.collect_numbers(records, numbers)
+        if self.staging is not None:
+            records = self.staged_changes(records)
+        if track_seen:
+            records = chain(records, self.compare_seen_responses(numbers))
+        yield from self.metrics.timed_emit(records)
+
+    @property
+    def tracks_seen_responses(self) -> bool:
+        """Return True if the response numbers of each export are kept in state."""
+        if not self.config.get("track_seen_responses"):
+            return False
+        if self.row_filters or "Number" in self.deselected_properties:
+            self.logger.warning(f"'{self.name}' has row filters or no Number, not tracking responses.")
+            return False
+        return True
+
+    def collect_numbers(self, records: Iterable[dict], numbers: List[int]) -> Iterator[dict]:
+        """Yield `records`, appending their response numbers to `numbers`."""
+        for record in records:
+            number = record.get("Number")
+            if number is not None and str(number).isdigit():
+                numbers.append(int(number))
+            yield record
+
+    def compare_seen_responses(self, numbers: List[int]) -> Iterator[dict]:
+        """Compare an export's response numbers with those seen by earlier syncs.
+
+        Counts the responses seen before but missing from the export, and the
+        numbers never seen below the export's highest, then keeps the export's
+        numbers in the stream state. With `emit_deletes` and no staging store,
+        yields a deletion marker for each missing response.
+        """
+        runs = number_runs(numbers)
+        previous = self.stream_state.get(SEEN_NUMBERS_STATE_KEY)
+        missing = runs_difference(decode_runs(previous), runs) if previous else []
+        self.metrics.increment("hotjar.responses.missing", run_count(missing))
+        self.metrics.increment("hotjar.responses.gaps", run_count(runs_gaps(runs)))
+        if missing:
+            self.logger.info(f"{run_count(missing)} responses of '{self.name}' are missing from the export.")
+        self.stream_state[SEEN_NUMBERS_STATE_KEY] = encode_runs(runs)
+        if self.config.get("emit_deletes") and not self.config.get("staging_db"):
+            deleted_at = datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds")
+            key_type = self.response_key_type
+            for number in run_numbers(missing):
+                yield {"Number": key_type(str(number)), DELETED_AT_PROPERTY: deleted_at}
+
+    def staged_changes(self, records: Iterable[dict]) -> Iterator[dict]:
+        """Yield the records that changed since the last sync of the staging store.
+
+        With `emit_deletes`, then yields a deletion marker for each response
+        missing from the export, unless row filters hide some responses.
+        """
+        changed = 0
+        for record in self.staging.changes(self.name, records):
+            changed += 1
+            yield record
+        self.metrics.increment("hotjar.staging.changed", changed)
+        if self.config.get("emit_deletes") and self.row_filters:
+            self.logger.warning(f"'{self.name}' has row filters, not emitting deletes.")
+        elif self.config.get("emit_deletes"):
+            deleted_at = datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds")
+            markers = list(
+                self.staging.deletion_markers(self.name, deleted_at, self.response_key_type)
+            )
+            self.metrics.increment("hotjar.staging.deleted", len(markers))
+            yield from markers
+
+    @contextmanager
+    def staging_store(self) -> Iterator[None]:
+        """Open the `staging_db` for a sync, keeping its changes if the sync succeeds."""
+        path = self.config.get("staging_db")
+        if not path:
+            yield
+            return
+        if "Number" in self.deselected_properties:
+            self.logger.warning(f"'{self.name}' has no Number, emitting every record.")
+            yield
+            return
+        with StagingStore(path) as self.staging:
+            try:
+                yield
+            except BaseException:
+                self.staging.rollback()
+                raise
+            else:
+                self.staging.commit()
+            finally:
+                self.staging = None
+
+    def post_process_batch(
+        self, batch: pd.DataFrame, context: Optional[dict] = None
+    ) -> pd.DataFrame:
+        """Transform a chunk of parsed records as a whole.
+
+        Override to hash, normalise or enrich records with vectorized
+        operations. The chunk has a column per property, with `object` dtype
+        and missing values as None; rows can be dropped or added. Runs
+        before the per record `post_process`. In Parquet output mode, the
+        chunk is the whole export, typed as in the Parquet files.
+        """
+        return batch
+
+    @property
+    def has_batch_post_process(self) -> bool:
+        """Return True if the stream overrides `post_process_batch`."""
+        return type(self).post_process_batch is not SurveysStream.post_process_batch
+
+    def post_process_batches(
+        self, records: Iterable[dict], context: Optional[dict]
+    ) -> Iterable[dict]:
+        """Run `post_process_batch` over parsed records, chunk by chunk."""
+        elapsed = 0.0
+        for chunk in frame_chunks(records, self.POST_PROCESS_BATCH_SIZE):
+            start = time.perf_counter()
+            batch = frame_records(self.post_process_batch(chunk, context))
+            elapsed += time.perf_counter() - start
+            yield from batch
+        self.record_stage("post_process", elapsed)
+
+    def sync_stream(self, context: Optional[dict] = None) -> None:
+        """Sync the stream, or write it to Parquet files in Parquet output mode.
+
+        The paths of the files written are kept in the stream's state.
+        """
+        directory = self.config.get("parquet_output_dir")
+        if not directory or not self.selected:
+            with self.staging_store():
+                super().sync_stream(context)
+            return
+        self.logger.info(f"Writing '{self.name}' to Parquet files in {directory}...")
+        table = self.prefetched_records
+        self.prefetched_records = None
+        if table is None:
+            table = self.parse_export(self.fetch_export(context))
+        if self.has_batch_post_process:
+            import pyarrow as pa
+
+            with self.stage("post_process"):
+                table = pa.Table.from_pandas(
+                    self.post_process_batch(table.to_pandas(), context), preserve_index=False
+                )
+        with self.stage("write"):
+            paths = write_partitions(table, directory, self.name, self.survey_id)
+        self.metrics.increment("hotjar.parquet.rows", table.num_rows)
+        self.metrics.increment("hotjar.parquet.files", len(paths))
+        self.stream_state["parquet_files"] = paths
+        self._write_state_message()
+
+    def fetch_export(self, context: Optional[dict] = None) -> bytes:
+        """Request the export and download it, as `request_records` would."""
+        prepared_request = self.prepare_request(context, next_page_token=None)
+        response = self.request_decorator(self._request)(prepared_request, context)
+        self.update_sync_costs(prepared_request, response, context)
+        return self.download_export(response)
+
+    def download_export(self, response: requests.Response) -> bytes:
+        """Download the zipped export the export response points to."""
+        # The export is generated server side while the request is open.
+        self.record_stage("export", response.elapsed.total_seconds())
         zip_download_url = response.json().get("download_url")
         if not zip_download_url:
             raise HotJarApiError()
-        surveys_zip_bin = requests.get(zip_download_url).content
-        with zipfile.ZipFile(io.BytesIO(surveys_zip_bin)) as thezip:
-            for zipinfo in thezip.infolist():
-                with thezip.open(zipinfo) as thefile:
-                    csv = io.StringIO(thefile.read().decode("utf-8"))
-        df = pd.read_csv(csv, dtype=object)
-        unicode_mappings = {column: clean(column) for column in df.columns}
-        df = df.rename(columns=unicode_mappings)
-        data_str = df.to_json(None, orient='records')
-        data = json.loads(data_str)
-        yield from data
+        with self.stage("download"):
+            surveys_zip_bin = requests.get(zip_download_url).content
+        self.metrics.increment("hotjar.download.bytes", len(surveys_zip_bin))
+        return surveys_zip_bin
+
+    def parse_export(self, surveys_zip_bin: bytes) -> Iterable[dict]:
+        """Parse a zipped export.
+
+        Returns a record batch, or a lazy iterator when the export is parsed
+        row by row to stay within the soft memory limit or in chunks of
+        `pandas_chunk_size` rows. In Parquet output mode, returns an Arrow
+        table.
+        """
+        thezip = TimedZipFile(io.BytesIO(surveys_zip_bin))
+        members = export_members(thezip)
+        verify_members(thezip, members, len(surveys_zip_bin))
+        options = self.parse_options
+        process_parse_min_mb = self.config.get("process_parse_min_mb")
+        start = time.perf_counter()
+        self.check_filter_columns(thezip, members, options)
+        if self.config.get("parquet_output_dir"):
+            with thezip:
+                tables = self.parse_members(
+                    lambda member: read_export_table(thezip, member, options, self.property_types),
+                    members,
+                )
+                data = concat_tables(tables)
+        elif self.exceeds_memory_limit(members):
+            self.verify_crc(thezip, members, len(surveys_zip_bin))
+            return self.timed_iter(
+                "parse",
+                chain.from_iterable(iter_export(thezip, member, options) for member in members),
+                "hotjar.parse.rows",
+                lambda seconds: self.record_parse(seconds, thezip.unzip_seconds),
+            )
+        elif process_parse_min_mb and len(surveys_zip_bin) >= process_parse_min_mb * 1024 * 1024:
+            pool = process_pool(self.config.get("process_parse_workers"))
+            futures = [
+                pool.submit(parse_export_batch, surveys_zip_bin, options, member.filename)
+                for member in members
+            ]
+            data = RecordBatches([future.result() for future in futures])
+            thezip.add_unzip_time(sum(batch.unzip_seconds for batch in data.batches))
+        elif self.csv_engine == "arrow":
+
+            def parse(member: zipfile.ZipInfo) -> Iterable[dict]:
+                try:
+                    return read_export_arrow(thezip, member, options, self.property_types)
+                except ValueError as ex:
+                    # pyarrow's errors derive from ValueError; ragged rows, for
+                    # one, are only accepted by pandas.
+                    self.logger.warning(f"Arrow could not parse {member.filename}, using pandas: {ex}")
+                    return read_export(thezip, member, options)
+
+            with thezip:
+                data = RecordBatches(self.parse_members(parse, members))
+        elif self.config.get("pandas_chunk_size"):
+            self.verify_crc(thezip, members, len(surveys_zip_bin))
+            chunk_size = self.config["pandas_chunk_size"]
+            return self.timed_iter(
+                "parse",
+                (
+                    record
+                    for member in members
+                    for chunk in iter_export_chunks(thezip, member, options, chunk_size)
+                    for record in chunk
+                ),
+                "hotjar.parse.rows",
+                lambda seconds: self.record_parse(seconds, thezip.unzip_seconds),
+            )
+        else:
+            with thezip:
+                data = RecordBatches(
+                    self.parse_members(
+                        lambda member: read_export(thezip, member, options), members
+                    )
+                )
+        self.metrics.sample_memory()
+        self.record_parse(time.perf_counter() - start, thezip.unzip_seconds)
+        self.metrics.increment("hotjar.parse.rows", len(data))
+        return data
+
+    def check_filter_columns(
+        self, thezip: zipfile.ZipFile, members: List[zipfile.ZipInfo], options: ParseOptions
+    ) -> None:
+        """Warn about members lacking a column the row filters need."""
+        for member in members:
+            for column in missing_filter_columns(thezip, member, options):
+                self.logger.warning(
+                    f"'{self.name}' filters on '{column}', which {member.filename} "
+                    "does not have: none of its rows pass."
+                )
+
+    def verify_crc(self, thezip: TimedZipFile, members: List[zipfile.ZipInfo], archive_size: int) -> None:
+        """Check the CRC of the members before parsing them as streams, as the "unzip" stage."""
+        with self.stage("unzip"):
+            verify_members(thezip, members, archive_size, check_crc=True)
+        thezip.unzip_seconds = 0.0
+
+    def record_parse(self, seconds: float, unzip_seconds: float) -> None:
+        """Record a parse of `seconds`, with its decompression as the "unzip" stage."""
+        self.record_stage("unzip", unzip_seconds)
+        # Members decompressed concurrently can add up to more than the parse.
+        self.record_stage("parse", max(seconds - unzip_seconds, 0.0))
+
+    def parse_members(
+        self, parse: Callable[[zipfile.ZipInfo], Any], members: List[zipfile.ZipInfo]
+    ) -> List[Any]:
+        """Parse the members of an export, concurrently when there are several."""
+        if len(members) == 1:
+            return [parse(members[0])]
+        self.logger.info(f"Parsing {len(members)} export members of '{self.name}'.")
+        with ThreadPoolExecutor(len(members), thread_name_prefix="hotjar-member") as pool:
+            return list(pool.map(parse, members))
+
+    @property
+    def csv_engine(self) -> str:
+        """The configured CSV engine, falling back to pandas without pyarrow."""
+        engine = self.config.get("csv_engine") or "pandas"
+        if engine == "arrow" and not arrow_available():
+            self.logger.warning("pyarrow is not installed, parsing exports with pandas.")
+            return "pandas"
+        return engine
+
+    @property
+    def property_types(self) -> Dict[str, str]:
+        """The JSON schema type of each property, without `null`."""
+        types = {}
+        for name, prop in self.schema["properties"].items():
+            prop_types = prop.get("type", "string")
+            if isinstance(prop_types, str):
+                prop_types = [prop_types]
+            types[name] = next((t for t in prop_types if t != "null"), "string")
+        return types
+
+    @property
+    def parse_options(self) -> ParseOptions:
+        """How the parsers turn this stream's exports into records."""
+        deselected = self.deselected_properties
+        timestamps = ()
+        if not deselected & {"Date Submitted", SUBMITTED_AT_PROPERTY}:
+            timestamps = (("Date Submitted", SUBMITTED_AT_PROPERTY),)
+        # Every path the arrow engine falls back to types the records as it
+        # does, so the records do not depend on the export's size.
+        types = tuple(self.property_types.items()) if self.csv_engine == "arrow" else ()
+        return ParseOptions(
+            clean,
+            deselected,
+            self.row_filters,
+            None if EXPORT_MEMBER_PROPERTY in deselected else EXPORT_MEMBER_PROPERTY,
+            self.value_transforms,
+            timestamps,
+            self.config.get("date_submitted_timezone") or "UTC",
+            types,
+        )
+
+    @property
+    def response_key_type(self) -> Callable[[str], Any]:
+        """Converts a response number to the type of the records' `Number`."""
+        return CONVERTERS.get(dict(self.parse_options.types).get("Number", "string"), str)
+
+    @property
+    def answer_properties(self) -> List[str]:
+        """The string properties holding answers to the survey's questions."""
+        return [
+            name
+            for name, type_ in self.property_types.items()
+            if type_ == "string" and name not in RESPONSE_METADATA_PROPERTIES
+        ]
+
+    @property
+    def value_transforms(self) -> Tuple[Tuple[str, ValueTransform], ...]:
+        """The transforms the parsers apply to column values, by property."""
+        transforms = []
+        if self.config.get("normalize_answers"):
+            normalize = text_normalizer(bool(self.config.get("transliterate_answers")))
+            transforms.extend((name, normalize) for name in self.answer_properties)
+        for name, mode in (self.config.get("pii_columns") or {}).items():
+            if name in self.schema["properties"]:
+                transforms.append((name, pii_transform(mode, self.config.get("pii_salt"))))
+        return tuple(transforms)
+
+    @property
+    def deselected_properties(self) -> FrozenSet[str]:
+        """Properties deselected in the catalog, which the parsers skip."""
+        return frozenset(
+            name
+            for name in self.schema["properties"]
+            if not self.mask[("properties", name)]
+        )
+
+    def exceeds_memory_limit(self, members: List[zipfile.ZipInfo]) -> bool:
+        """Return True if parsing `members` at once could exceed the soft memory cap."""
+        limit_mb = self.config.get("memory_soft_limit_mb")
+        if not limit_mb:
+            return False
+        estimate = self.metrics.sample_memory() + estimate_eager_parse_bytes(members)
+        if estimate <= limit_mb * 1024 * 1024:
+            return False
+        self.logger.info(
+            f"Parsing {', '.join(member.filename for member in members)} "
+            f"({sum(member.file_size for member in members)} bytes) as a stream "
+            f"to stay within the {limit_mb} MB soft memory limit."
+        )
+        return True
 
     def post_process(self, row: dict, context: Optional[dict] = None) -> Optional[dict]:
         return row
@@ -1,9 +1,31 @@
 """HotJar tap class."""
 
-from typing import List
+import datetime
+from typing import Iterable, List
 
 from singer_sdk import Tap, Stream
 from singer_sdk import typing as th  # JSON schema typing helpers
+from singer_sdk.exceptions import ConfigValidationError
+
+from tap_hotjar.metrics import write_prometheus_textfile
+from tap_hotjar.parsing import (
+    RowFilter,
+    arrow_available,
+    iso_timestamps,
+    shutdown_process_pool,
+)
+from tap_hotjar.pipeline import ExportPipeline
+from tap_hotjar.profiling import write_profile_summary
+from tap_hotjar.scheduling import (
+    assign_shards,
+    read_runtime_stats,
+    read_weights,
+    runtime_entry,
+    schedule_order,
+    write_runtime_stats,
+)
+from tap_hotjar.tracing import get_tracer
+from tap_hotjar.transforms import pii_transform
 # TODO: Import your custom stream types here:
 from tap_hotjar.streams import (
     HotJarStream,
@@ -264,6 +286,73 @@ STREAM_TYPES = [
 ]
 
 
+def _check_parquet_output(config: dict) -> None:
+    if config.get("parquet_output_dir") and not arrow_available():
+        raise ConfigValidationError(
+            "parquet_output_dir requires pyarrow: pip install tap-hotjar[arrow]"
+        )
+
+
+def _check_pii_columns(config: dict) -> None:
+    for mode in (config.get("pii_columns") or {}).values():
+        try:
+            pii_transform(mode, config.get("pii_salt"))
+        except ValueError as ex:
+            raise ConfigValidationError(str(ex))
+
+
+def _check_timezone(config: dict) -> None:
+    timezone = config.get("date_submitted_timezone") or "UTC"
+    try:
+        iso_timestamps([], timezone)
+    except LookupError:
+        raise ConfigValidationError(f"Unknown date_submitted_timezone '{timezone}'.")
+
+
+def _check_stale_after_hours(config: dict) -> None:
+    if config.get("stale_after_hours", 24) <= 0:
+        raise ConfigValidationError("stale_after_hours must be greater than 0.")
+
+
+def _check_stream_filters(config: dict) -> None:
+    # Row filters are built lazily by each stream; a bad one must not fail the
+    # run after earlier streams have been synced.
+    for name, specs in (config.get("stream_filters") or {}).items():
+        if not isinstance(specs, list):
+            raise ConfigValidationError(f"stream_filters of '{name}' must be a list.")
+        for spec in specs:
+            try:
+                RowFilter.from_config(spec)
+            except ValueError as ex:
+                raise ConfigValidationError(f"stream_filters of '{name}': {ex}")
+
+
+def _check_filter_columns(config: dict, streams: Iterable[Stream]) -> None:
+    # A filter on a column the stream does not have would drop all its rows.
+    stream_filters = config.get("stream_filters") or {}
+    for stream in streams:
+        specs = [*stream_filters.get("*", []), *stream_filters.get(stream.name, [])]
+        for spec in specs:
+            if spec["column"] not in stream.schema["properties"]:
+                raise ConfigValidationError(
+                    f"stream_filters of '{stream.name}': "
+                    f"no '{spec['column']}' column to filter on."
+                )
+
+
+def validate_config(config: dict, streams: Iterable[Stream] = ()) -> None:
+    """Check the settings the streams only use once they sync.
+
+    Raises ConfigValidationError before any of `streams` has been synced.
+    """
+    _check_parquet_output(config)
+    _check_pii_columns(config)
+    _check_timezone(config)
+    _check_stale_after_hours(config)
+    _check_stream_filters(config)
+    _check_filter_columns(config, streams)
+
+
 class TapHotJar(Tap):
     """HotJar tap class."""
     name = "tap-hotjar"
@@ -282,12 +371,263 @@ class TapHotJar(Tap):
             required=True,
             description="Project IDs to replicate"
         ),
+        th.Property(
+            "api_url",
+            th.StringType,
+            description="Base URL of the Hotjar API, e.g. a local mock server"
+        ),
+        th.Property(
+            "prometheus_textfile",
+            th.StringType,
+            description="Path of a Prometheus textfile to write sync metrics to"
+        ),
+        th.Property(
+            "profile_dir",
+            th.StringType,
+            description="Directory to write one cProfile file per stream and a merged summary to. With concurrent_exports, exports, downloads and parses run in pool threads and are not profiled"
+        ),
+        th.Property(
+            "trace_file",
+            th.StringType,
+            description="File to append OpenTelemetry (OTLP/JSON) trace spans to"
+        ),
+        th.Property(
+            "memory_soft_limit_mb",
+            th.IntegerType,
+            description="Parse exports row by row when parsing them at once could exceed this RSS"
+        ),
+        th.Property(
+            "shard_count",
+            th.IntegerType,
+            description="Split the selected streams into this many shards, each synced by its own process"
+        ),
+        th.Property(
+            "shard_index",
+            th.IntegerType,
+            description="Zero-based index of the shard this process syncs"
+        ),
+        th.Property(
+            "shard_weights_file",
+            th.StringType,
+            description="JSON file mapping stream names to past runtimes (or a runtime stats file), used to balance the shards"
+        ),
+        th.Property(
+            "runtime_stats_file",
+            th.StringType,
+            description="JSON file recording each stream's stage durations, used to start the longest streams first"
+        ),
+        th.Property(
+            "stale_after_hours",
+            th.NumberType,
+            default=24,
+            description="Each period a stream has not synced for counts as one more run time when ordering streams"
+        ),
+        th.Property(
+            "concurrent_exports",
+            th.IntegerType,
+            default=1,
+            description="Number of exports to request and download at once while earlier streams are emitted"
+        ),
+        th.Property(
+            "parse_workers",
+            th.IntegerType,
+            default=1,
+            description="Number of threads parsing downloaded exports when concurrent_exports is above 1"
+        ),
+        th.Property(
+            "max_pending_exports",
+            th.IntegerType,
+            description="Most streams exported or parsed but not yet emitted (default: twice concurrent_exports)"
+        ),
+        th.Property(
+            "process_parse_min_mb",
+            th.NumberType,
+            description="Parse zipped exports of at least this size in a separate process"
+        ),
+        th.Property(
+            "process_parse_workers",
+            th.IntegerType,
+            description="Number of processes parsing large exports (default: one per CPU)"
+        ),
+        th.Property(
+            "csv_engine",
+            th.StringType,
+            default="pandas",
+            description="Library parsing exports: pandas, or arrow for pyarrow's multithreaded "
+            "reader with schema types (falls back to pandas when pyarrow is not installed)"
+        ),
+        th.Property(
+            "pandas_chunk_size",
+            th.IntegerType,
+            description="Parse exports with pandas this many rows at a time, so memory "
+            "depends on the chunk size rather than on the size of the survey"
+        ),
+        th.Property(
+            "parquet_output_dir",
+            th.StringType,
+            description="Write survey records to Parquet files partitioned by stream, survey and date "
+            "in this directory instead of emitting Singer records (requires pyarrow)"
+        ),
+        th.Property(
+            "normalize_answers",
+            th.BooleanType,
+            default=False,
+            description="Strip control characters from free text answers and normalise them to Unicode NFC"
+        ),
+        th.Property(
+            "transliterate_answers",
+            th.BooleanType,
+            default=False,
+            description="With normalize_answers, also transliterate answers to ASCII"
+        ),
+        th.Property(
+            "pii_columns",
+            th.ObjectType(),
+            description="How to protect personal data columns before records are built, e.g. "
+            '{"User": "hash", "ICMCustomerID": "redact"}: hash (salted SHA-256) or redact (null)'
+        ),
+        th.Property(
+            "pii_salt",
+            th.StringType,
+            description="Secret salt of the PII column hashes"
+        ),
+        th.Property(
+            "stream_filters",
+            th.ObjectType(),
+            description="Row filters by stream name, or `*` for all streams, e.g. "
+            '{"*": [{"column": "Device", "op": "eq", "value": "mobile"}]}. Operators: '
+            "eq, ne, in, not_in, gt, gte, lt, lte"
+        ),
+        th.Property(
+            "push_filters_to_export",
+            th.BooleanType,
+            default=False,
+            description="Also send Country, Device and Date Submitted filters to Hotjar as export query clauses"
+        ),
+        th.Property(
+            "date_submitted_timezone",
+            th.StringType,
+            default="UTC",
+            description="IANA timezone of the exported Date Submitted values, used to convert them to UTC for submitted_at"
+        ),
+        th.Property(
+            "staging_db",
+            th.StringType,
+            description="Path of a SQLite database keeping a hash of each emitted response, to only emit new and changed responses"
+        ),
+        th.Property(
+            "emit_deletes",
+            th.BooleanType,
+            default=False,
+            description="With staging_db or track_seen_responses, emit a record with _sdc_deleted_at set for each response missing from the export"
+        ),
+        th.Property(
+            "track_seen_responses",
+            th.BooleanType,
+            default=False,
+            description="Keep the response numbers seen in the stream state, to count missing responses and gaps in each export"
+        ),
     ).to_dict()
 
     def discover_streams(self) -> List[Stream]:
         """Return a list of discovered streams."""
         return [stream_class(tap=self) for stream_class in STREAM_TYPES]
 
+    def sync_all(self) -> None:
+        """Sync the streams of this shard, then export the collected metrics and profiles."""
+        with get_tracer(self.config.get("trace_file")).span("sync_all", tap=self.name):
+            validate_config(
+                self.config, [stream for stream in self.streams.values() if stream.selected]
+            )
+            self._reset_state_progress_markers()
+            self._set_compatible_replication_methods()
+            streams = self.streams_to_sync()
+            concurrent_exports = self.config.get("concurrent_exports") or 1
+            if concurrent_exports > 1:
+                streams = ExportPipeline(
+                    streams,
+                    io_workers=concurrent_exports,
+                    parse_workers=self.config.get("parse_workers") or 1,
+                    max_pending=self.config.get("max_pending_exports") or 0,
+                ).run()
+            try:
+                for stream in streams:
+                    stream.sync()
+                    stream.finalize_state_progress_markers()
+            finally:
+                shutdown_process_pool()
+            for stream in self.streams.values():
+                stream.log_sync_costs()
+        if self.config.get("runtime_stats_file"):
+            now = datetime.datetime.now(datetime.timezone.utc)
+            write_runtime_stats(
+                self.config["runtime_stats_file"],
+                {
+                    stream.name: runtime_entry(stream.metrics.timers, now)
+                    for stream in self.streams.values()
+                    if "sync" in stream.metrics.timers
+                },
+            )
+        if self.config.get("prometheus_textfile"):
+            write_prometheus_textfile(
+                self.config["prometheus_textfile"],
+                [stream.metrics for stream in self.streams.values() if stream.metrics.timers],
+            )
+        if self.config.get("profile_dir"):
+            summary = write_profile_summary(
+                self.config["profile_dir"],
+                [stream.name for stream in self.streams.values() if "sync" in stream.metrics.timers],
+            )
+            if summary:
+                self.logger.info(f"Profile summary written to {summary}")
+
+    def streams_to_sync(self) -> List[Stream]:
+        """Return the selected streams of this process's shard, longest first."""
+        selected = []
+        for stream in self.streams.values():
+            if stream.selected:
+                selected.append(stream)
+            else:
+                self.logger.info(f"Skipping deselected stream '{stream.name}'.")
+
+        stats = {}
+        if self.config.get("runtime_stats_file"):
+            stats = read_runtime_stats(self.config["runtime_stats_file"])
+            order = schedule_order(
+                [stream.name for stream in selected],
+                stats,
+                datetime.datetime.now(datetime.timezone.utc),
+                datetime.timedelta(hours=self.config.get("stale_after_hours", 24)),
+            )
+            position = {name: index for index, name in enumerate(order)}
+            selected.sort(key=lambda stream: position[stream.name])
+
+        shard_count = self.config.get("shard_count") or 1
+        if shard_count <= 1:
+            return selected
+        shard_index = self.config.get("shard_index", 0)
+        if not 0 <= shard_index < shard_count:
+            raise ConfigValidationError(
+                f"shard_index must be between 0 and {shard_count - 1}, got {shard_index}"
+            )
+        weights = None
+        if self.config.get("shard_weights_file"):
+            weights = read_weights(self.config["shard_weights_file"])
+        shards = assign_shards([stream.name for stream in selected], shard_count, weights)
+        in_shard = []
+        for stream in selected:
+            if shards[stream.name] == shard_index:
+                in_shard.append(stream)
+            else:
+                self.logger.info(
+                    f"Skipping stream '{stream.name}' of shard {shards[stream.name]}."
+                )
+        self.logger.info(
+            f"Syncing {len(in_shard)} of {len(selected)} selected streams "
+            f"as shard {shard_index} of {shard_count}."
+        )
+        return in_shard
+
 
 if __name__ == "__main__":
     TapHotJar.cli()
@@ -0,0 +1,356 @@
+"""A local stand-in for insights.hotjar.com.
+
+Serves the login, survey export (sync and async) and zip download endpoints
+used by the tap, with synthetic responses of configurable size and optional
+latency, rate limiting and server errors. It only depends on the standard
+library, so it can run in CI without network access:
+
+    with MockHotjarServer(rows=1000, error_rate=0.1) as server:
+        tap = TapHotJar(config={..., "api_url": server.api_url})
+
+It can also be started on its own for load testing:
+
+    python -m tap_hotjar.tests.mock_hotjar --port 8080 --rows 100000
+"""
+
+import argparse
+import csv
+import io
+import json
+import random
+import re
+import secrets
+import threading
+import time
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, List, Optional, Sequence
+from urllib.parse import parse_qs, urlparse
+
+STANDARD_COLUMNS = [
+    "Number",
+    "User",
+    "Date Submitted",
+    "Country",
+    "Source URL",
+    "Device",
+    "Browser",
+    "OS",
+    "Hotjar User ID",
+]
+
+DEFAULT_QUESTIONS = [
+    "How likely are you to recommend us to a friend or colleague?",
+    "What's the reason for your score?",
+    "Help us make your experience better! Are you professional or consumer?",
+]
+
+MULTILINGUAL_QUESTIONS = [
+    "Bizi bir arkadaşınıza veya meslektaşınıza tavsiye eder misiniz?",
+    "Чем вы руководствовались при выборе вашей оценки?",
+    "Deneyiminizi daha iyi hale getirmemize yardımcı olun! \nSatıcı mısınız yoksa son kullanıcı mısınız?",
+    "¿Qué debemos hacer para que le sorprenda?",
+]
+
+COUNTRIES = ["France", "Germany", "Spain", "Turkey", "Brazil", "Mexico", "Italy"]
+DEVICES = ["desktop", "mobile", "tablet"]
+BROWSERS = ["Chrome", "Safari", "Firefox", "Edge"]
+SYSTEMS = ["Windows", "Mac OS", "iOS", "Android", "Linux"]
+ANSWERS = [
+    "Très bon produit, livraison rapide.",
+    "Не смог найти нужное масло.",
+    "Çok iyi\nama biraz pahalı",
+    'Good, but the "compare" page is slow.\nPlease fix it.',
+    "Professional",
+    "Consumer",
+    "",
+]
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+EXPORT_PATH = re.compile(
+    r"^/api/ask/v3/sites/(?P<site_id>\d+)/polls/(?P<survey_id>\d+)"
+    r"/responses/export(?:/(?P<export_id>\w+))?$"
+)
+DOWNLOAD_PATH = re.compile(r"^/downloads/(?P<site_id>\d+)-(?P<survey_id>\d+)\.zip$")
+
+
+def generate_rows(
+    rows: int, questions: Sequence[str], seed: int = 0
+) -> Iterable[List[str]]:
+    """Generate the rows of a synthetic survey export."""
+    rnd = random.Random(seed)
+    start = time.mktime((2022, 1, 1, 0, 0, 0, 0, 0, -1))
+    for number in range(rows, 0, -1):
+        row = [
+            str(number),
+            "",
+            time.strftime(DATE_FORMAT, time.gmtime(start + number * 97)),
+            rnd.choice(COUNTRIES),
+            f"https://www.example.com/{rnd.choice(['fr', 'en', 'es'])}/product/{rnd.randrange(500)}",
+            rnd.choice(DEVICES),
+            rnd.choice(BROWSERS),
+            rnd.choice(SYSTEMS),
+            f"{rnd.getrandbits(32):08x}",
+        ]
+        for index, _ in enumerate(questions):
+            row.append(str(rnd.randrange(11)) if index == 0 else rnd.choice(ANSWERS))
+        yield row
+
+
+def write_export_zip(
+    target,
+    rows: int,
+    questions: Sequence[str] = DEFAULT_QUESTIONS,
+    seed: int = 0,
+    member: str = "responses.csv",
+) -> None:
+    """Write a zipped survey export with `rows` responses to `target`."""
+    with zipfile.ZipFile(target, "w", zipfile.ZIP_DEFLATED) as thezip:
+        with thezip.open(member, "w", force_zip64=True) as thefile:
+            text = io.TextIOWrapper(thefile, encoding="utf-8", newline="")
+            writer = csv.writer(text)
+            writer.writerow([*STANDARD_COLUMNS, *questions])
+            writer.writerows(generate_rows(rows, questions, seed))
+            text.flush()
+            text.detach()
+
+
+def make_export_zip(
+    rows: int, questions: Sequence[str] = DEFAULT_QUESTIONS, seed: int = 0
+) -> bytes:
+    """Return a zipped survey export with `rows` responses."""
+    buffer = io.BytesIO()
+    write_export_zip(buffer, rows, questions, seed)
+    return buffer.getvalue()
+
+
+class MockHotjarServer:
+    """Threaded HTTP server imitating the Hotjar API.
+
+    Args:
+        rows: Number of responses in every survey export.
+        questions: Question columns of the exports, by survey ID. Surveys
+            without an entry use `DEFAULT_QUESTIONS`.
+        latency: Seconds to wait before answering each request.
+        rate_limit_rate: Share of API requests answered with a 429.
+        error_rate: Share of API requests answered with a 5xx.
+        async_polls: Number of polls an async export stays in progress.
+        seed: Seed of the data and fault injection generators.
+    """
+
+    def __init__(
+        self,
+        rows: int = 100,
+        questions: Optional[Dict[str, Sequence[str]]] = None,
+        latency: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        error_rate: float = 0.0,
+        async_polls: int = 1,
+        seed: int = 0,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ) -> None:
+        self.rows = rows
+        self.questions = questions or {}
+        self.latency = latency
+        self.rate_limit_rate = rate_limit_rate
+        self.error_rate = error_rate
+        self.async_polls = async_polls
+        self.seed = seed
+        self.token = secrets.token_hex(16)
+        self.requests: List[str] = []
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._exports: Dict[str, bytes] = {}
+        self._pending: Dict[str, int] = {}
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """Root URL of the server."""
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def api_url(self) -> str:
+        """URL to use as the tap's `api_url` setting."""
+        return f"{self.url}/api"
+
+    def start(self) -> "MockHotjarServer":
+        """Serve requests on a background thread."""
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop serving and release the port."""
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> "MockHotjarServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def export_zip(self, site_id: str, survey_id: str) -> bytes:
+        """Return the (cached) export of a survey."""
+        key = f"{site_id}-{survey_id}"
+        with self._lock:
+            if key not in self._exports:
+                questions = self.questions.get(survey_id, DEFAULT_QUESTIONS)
+                self._exports[key] = make_export_zip(self.rows, questions, self.seed)
+            return self._exports[key]
+
+    def _injected_fault(self) -> Optional[int]:
+        with self._lock:
+            draw = self._random.random()
+            if draw < self.rate_limit_rate:
+                return 429
+            if draw < self.rate_limit_rate + self.error_rate:
+                return self._random.choice([500, 502, 503])
+        return None
+
+    def _start_async_export(self) -> str:
+        export_id = secrets.token_hex(8)
+        with self._lock:
+            self._pending[export_id] = self.async_polls
+        return export_id
+
+    def _poll_async_export(self, export_id: str) -> Optional[bool]:
+        with self._lock:
+            if export_id not in self._pending:
+                return None
+            if self._pending[export_id] > 0:
+                self._pending[export_id] -= 1
+                return False
+            return True
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args) -> None:
+                pass
+
+            def send_json(
+                self, status: int, body: dict, headers: Optional[dict] = None
+            ) -> None:
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def begin(self) -> bool:
+                """Apply latency and faults; return False if the request failed."""
+                server.requests.append(f"{self.command} {self.path}")
+                if server.latency:
+                    time.sleep(server.latency)
+                fault = server._injected_fault()
+                if fault == 429:
+                    self.send_json(429, {"error": "rate_limited"}, {"Retry-After": "1"})
+                    return False
+                if fault:
+                    self.send_json(fault, {"error": "server_error"})
+                    return False
+                return True
+
+            def do_POST(self) -> None:
+                if urlparse(self.path).path != "/api/v2/users":
+                    self.send_json(404, {"error": "not_found"})
+                    return
+                if not self.begin():
+                    return
+                length = int(self.headers.get("Content-Length") or 0)
+                credentials = json.loads(self.rfile.read(length) or b"{}")
+                if credentials.get("action") != "login" or not (
+                    credentials.get("email") and credentials.get("password")
+                ):
+                    self.send_json(401, {"error": "invalid_credentials"})
+                    return
+                self.send_json(
+                    200,
+                    {"success": True},
+                    {"Set-Cookie": f"ACC={server.token}; Path=/"},
+                )
+
+            def do_GET(self) -> None:
+                url = urlparse(self.path)
+                download = DOWNLOAD_PATH.match(url.path)
+                if download:
+                    payload = server.export_zip(download["site_id"], download["survey_id"])
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/zip")
+                    self.send_header("Content-Length", str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                    return
+                export = EXPORT_PATH.match(url.path)
+                if not export:
+                    self.send_json(404, {"error": "not_found"})
+                    return
+                if not self.begin():
+                    return
+                if self.headers.get("X-Acc") != server.token:
+                    self.send_json(401, {"error": "unauthorized"})
+                    return
+                download_url = (
+                    f"{server.url}/downloads/{export['site_id']}-{export['survey_id']}.zip"
+                )
+                if export["export_id"]:
+                    done = server._poll_async_export(export["export_id"])
+                    if done is None:
+                        self.send_json(404, {"error": "not_found"})
+                    elif done:
+                        self.send_json(200, {"status": "completed", "download_url": download_url})
+                    else:
+                        self.send_json(200, {"status": "in_progress"})
+                    return
+                query = parse_qs(url.query)
+                if query.get("async_export", ["false"])[0] == "true":
+                    export_id = server._start_async_export()
+                    self.send_json(200, {"status": "in_progress", "export_id": export_id})
+                    return
+                self.send_json(200, {"download_url": download_url})
+
+        return Handler
+
+
+def main() -> None:
+    """Run the mock server in the foreground."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--async-polls", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    server = MockHotjarServer(
+        rows=args.rows,
+        latency=args.latency,
+        rate_limit_rate=args.rate_limit_rate,
+        error_rate=args.error_rate,
+        async_polls=args.async_polls,
+        seed=args.seed,
+        host=args.host,
+        port=args.port,
+    )
+    print(f"Serving the Hotjar API on {server.api_url}")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        server._httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Tests for the response number runs kept in state."""
+
+import json
+
+import pytest
+
+from tap_hotjar.bitmap import (
+    decode_runs,
+    encode_runs,
+    number_runs,
+    run_count,
+    run_numbers,
+    runs_difference,
+    runs_gaps,
+)
+from tap_hotjar.staging import DELETED_AT_PROPERTY
+from tap_hotjar.streams import SEEN_NUMBERS_STATE_KEY
+from tap_hotjar.tap import TapHotJar
+from tap_hotjar.tests.mock_hotjar import MockHotjarServer
+
+
+def test_runs_round_trip_compactly():
+    """Runs survive encoding, and contiguous numbers take a few bytes."""
+    runs = number_runs([7, 3, 4, 5, 10, 9, 4, 1])
+
+    assert runs == [(1, 1), (3, 5), (7, 7), (9, 10)]
+    assert decode_runs(encode_runs(runs)) == runs
+    assert decode_runs(encode_runs([])) == []
+    assert len(encode_runs(number_runs(range(1, 500001)))) < 32
+
+
+def test_missing_responses_and_gaps():
+    """Numbers seen before but missing now, and never seen numbers, are found."""
+    seen = number_runs([*range(1, 11), *range(20, 31)])
+    export = number_runs([*range(3, 8), 9, *range(25, 41)])
+
+    missing = runs_difference(seen, export)
+
+    assert list(run_numbers(missing)) == [1, 2, 8, 10, *range(20, 25)]
+    assert run_count(missing) == 9
+    assert runs_gaps(export) == [(1, 2), (8, 8), (10, 24)]
+    assert runs_difference(export, export) == []
+
+
+@pytest.mark.parametrize("csv_engine, key_type", [("pandas", str), ("arrow", int)])
+def test_stream_tracks_seen_responses(capsys, csv_engine, key_type):
+    """A sync compares its export with the numbers kept in state by the previous one."""
+    if csv_engine == "arrow":
+        pytest.importorskip("pyarrow")
+    state: dict = {}
+    for rows in (6, 4):
+        with MockHotjarServer(rows=rows) as server:
+            tap = TapHotJar(
+                config={
+                    "email": "a@b.c",
+                    "password": "x",
+                    "api_url": server.api_url,
+                    "track_seen_responses": True,
+                    "emit_deletes": True,
+                    "csv_engine": csv_engine,
+                },
+                state=state,
+                parse_env_config=False,
+            )
+            stream = tap.streams["survey_b2c_prod_en"]
+            stream.sync()
+        state = tap.state
+        messages = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+        records = [message["record"] for message in messages if message["type"] == "RECORD"]
+
+    emitted = [message["value"] for message in messages if message["type"] == "STATE"][-1]
+    bookmark = emitted["bookmarks"]["survey_b2c_prod_en"][SEEN_NUMBERS_STATE_KEY]
+    assert decode_runs(bookmark) == [(1, 4)]
+    assert stream.metrics.counters["hotjar.responses.missing"] == 2
+    assert stream.metrics.counters["hotjar.responses.gaps"] == 0
+    markers = [record for record in records if record.get(DELETED_AT_PROPERTY)]
+    assert sorted(record["Number"] for record in markers) == [key_type("5"), key_type("6")]
+    assert len(records) == 6
+    assert all(isinstance(record["Number"], key_type) for record in records)
@@ -0,0 +1,31 @@
+"""Tests for the sync metrics helpers."""
+
+import logging
+
+from tap_hotjar.metrics import StreamMetrics, write_prometheus_textfile
+
+
+def test_prometheus_textfile(tmp_path):
+    """Stage timers and counters are written as labelled gauges."""
+    metrics = StreamMetrics(logging.getLogger("test"), {"stream": "survey_a"})
+    metrics.add_time("download", 1.5)
+    metrics.increment("hotjar.download.bytes", 2048)
+
+    target = tmp_path / "tap_hotjar.prom"
+    write_prometheus_textfile(str(target), [metrics])
+
+    lines = target.read_text().splitlines()
+    assert 'tap_hotjar_stage_seconds{stage="download",stream="survey_a"} 1.500000' in lines
+    assert 'tap_hotjar_download_bytes{stream="survey_a"} 2048' in lines
+
+
+def test_throughput_covers_prefetching():
+    """Rows per second are over the total time, not only the emission."""
+    metrics = StreamMetrics(logging.getLogger("test"), {"stream": "survey_a"})
+    metrics.increment("hotjar.parse.rows", 1000)
+    metrics.add_time("sync", 0.5)
+    metrics.add_time("total", 4.0)
+
+    metrics.log_summary()
+
+    assert metrics.gauges["hotjar.sync.rows_per_second"] == 250.0
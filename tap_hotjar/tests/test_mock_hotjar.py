@@ -0,0 +1,244 @@
+"""End-to-end tests against the local mock Hotjar server."""
+
+import io
+import json
+import zipfile
+from unittest.mock import Mock
+
+import pytest
+import requests
+from singer_sdk.exceptions import ConfigValidationError
+
+from tap_hotjar.parsing import ParseOptions, export_members, iter_export
+from tap_hotjar.streams import B2CProdEN
+from tap_hotjar.tap import TapHotJar, validate_config
+from tap_hotjar.tests.mock_hotjar import MockHotjarServer
+
+EXPORT_QUERY = "responses/export?format=csv&async_export={}"
+
+
+def test_login_export_and_download():
+    """The mock serves the same flow the tap uses against Hotjar."""
+    with MockHotjarServer(rows=25) as server:
+        session = requests.Session()
+        session.post(
+            f"{server.api_url}/v2/users",
+            json={"action": "login", "email": "a@b.c", "password": "x"},
+        )
+        headers = {"X-Acc": session.cookies["ACC"]}
+        export_url = f"{server.api_url}/ask/v3/sites/1/polls/2/" + EXPORT_QUERY
+
+        assert requests.get(export_url.format("false")).status_code == 401
+
+        download_url = session.get(export_url.format("false"), headers=headers).json()[
+            "download_url"
+        ]
+        thezip = zipfile.ZipFile(io.BytesIO(requests.get(download_url).content))
+        records = list(iter_export(thezip, export_members(thezip)[0], ParseOptions(str.strip)))
+        assert [record["Number"] for record in records] == [
+            str(number) for number in range(25, 0, -1)
+        ]
+
+        pending = session.get(export_url.format("true"), headers=headers).json()
+        poll_url = f"{server.api_url}/ask/v3/sites/1/polls/2/responses/export/{pending['export_id']}"
+        assert session.get(poll_url, headers=headers).json()["status"] == "in_progress"
+        assert session.get(poll_url, headers=headers).json()["download_url"] == download_url
+
+
+def test_fault_injection():
+    """Configured shares of requests fail with 429 and 5xx responses."""
+    with MockHotjarServer(rate_limit_rate=0.5, error_rate=0.5) as server:
+        statuses = {
+            requests.get(f"{server.api_url}/ask/v3/sites/1/polls/2/responses/export").status_code
+            for _ in range(20)
+        }
+    assert 429 in statuses
+    assert statuses - {429} <= {500, 502, 503}
+
+
+def test_stream_sync_against_mock():
+    """A survey stream logs in, exports, downloads and parses via the mock."""
+    with MockHotjarServer(rows=40) as server:
+        tap = TapHotJar(
+            config={"email": "a@b.c", "password": "x", "api_url": server.api_url},
+            parse_env_config=False,
+        )
+        stream = tap.streams["survey_b2c_prod_en"]
+        records = list(stream.get_records(None))
+
+    assert len(records) == 40
+    assert stream.metrics.counters["hotjar.download.bytes"] > 0
+    assert "What's the reason for your score?" in records[0]
+
+
+@pytest.mark.parametrize(
+    "extra_config",
+    [
+        {},
+        {"pandas_chunk_size": 10},
+        {"memory_soft_limit_mb": 1},
+        {"process_parse_min_mb": 0.000001},
+    ],
+)
+def test_every_parse_path_times_unzip(extra_config):
+    """Decompressing the export is timed apart from parsing it."""
+    with MockHotjarServer(rows=40) as server:
+        tap = TapHotJar(
+            config={"email": "a@b.c", "password": "x", "api_url": server.api_url, **extra_config},
+            parse_env_config=False,
+        )
+        stream = tap.streams["survey_b2c_prod_en"]
+        assert len(list(stream.get_records(None))) == 40
+
+    assert stream.metrics.timers["unzip"] > 0
+    assert stream.metrics.timers["parse"] > 0
+
+
+def test_arrow_engine_types_records_on_every_parse_path(monkeypatch):
+    """The arrow engine's records do not depend on the path parsing the export."""
+    pytest.importorskip("pyarrow")
+
+    def records(server, **extra_config):
+        tap = TapHotJar(
+            config={
+                "email": "a@b.c",
+                "password": "x",
+                "api_url": server.api_url,
+                "csv_engine": "arrow",
+                **extra_config,
+            },
+            parse_env_config=False,
+        )
+        return list(tap.streams["survey_b2c_prod_en"].get_records(None))
+
+    with MockHotjarServer(rows=40) as server:
+        expected = records(server)
+        assert records(server, memory_soft_limit_mb=1) == expected
+        assert records(server, process_parse_min_mb=0.000001) == expected
+        # Exports Arrow cannot read are parsed with pandas.
+        monkeypatch.setattr(
+            "tap_hotjar.streams.read_export_arrow", Mock(side_effect=ValueError("ragged rows"))
+        )
+        assert records(server) == expected
+
+    assert all(isinstance(record["Number"], int) for record in expected)
+
+
+def test_batch_post_process_transforms_chunks():
+    """`post_process_batch` sees DataFrame chunks and its result is emitted."""
+    chunks = []
+
+    class MobileOnly(B2CProdEN):
+        POST_PROCESS_BATCH_SIZE = 15
+
+        def post_process_batch(self, batch, context=None):
+            chunks.append(len(batch))
+            batch = batch[batch["Device"] == "mobile"].copy()
+            batch["Country"] = batch["Country"].str.upper()
+            return batch
+
+    with MockHotjarServer(rows=40) as server:
+        tap = TapHotJar(
+            config={"email": "a@b.c", "password": "x", "api_url": server.api_url},
+            parse_env_config=False,
+        )
+        records = list(MobileOnly(tap=tap).get_records(None))
+
+    assert chunks == [15, 15, 10]
+    assert records and all(record["Device"] == "mobile" for record in records)
+    assert all(record["Country"].isupper() for record in records)
+
+
+def test_identity_batch_post_process_keeps_types():
+    """A `post_process_batch` returning its chunk emits the records unchanged."""
+    pytest.importorskip("pyarrow")
+
+    class Identity(B2CProdEN):
+        POST_PROCESS_BATCH_SIZE = 15
+
+        def post_process_batch(self, batch, context=None):
+            return batch
+
+    with MockHotjarServer(rows=40) as server:
+        tap = TapHotJar(
+            config={"email": "a@b.c", "password": "x", "api_url": server.api_url, "csv_engine": "arrow"},
+            parse_env_config=False,
+        )
+        records = list(tap.streams["survey_b2c_prod_en"].get_records(None))
+        processed = list(Identity(tap=tap).get_records(None))
+
+    assert processed == records
+    assert all(isinstance(record["Number"], int) for record in processed)
+
+
+def test_pipelined_sync_matches_sequential_sync(capsys):
+    """Prefetching exports emits the same records as syncing one by one."""
+    outputs = []
+    with MockHotjarServer(rows=5, latency=0.01) as server:
+        for extra_config in ({}, {"concurrent_exports": 4, "parse_workers": 2}):
+            tap = TapHotJar(
+                config={
+                    "email": "a@b.c",
+                    "password": "x",
+                    "api_url": server.api_url,
+                    **extra_config,
+                },
+                parse_env_config=False,
+            )
+            tap.sync_all()
+            messages = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+            outputs.append(
+                sorted(
+                    json.dumps(message["record"], sort_keys=True)
+                    for message in messages
+                    if message["type"] == "RECORD"
+                )
+            )
+
+    assert outputs[0] == outputs[1]
+    assert len(outputs[0]) == 5 * len(tap.streams)
+    # The pipelined streams' total includes the prefetching in the pool.
+    for stream in tap.streams.values():
+        timers = stream.metrics.timers
+        assert timers["total"] >= timers["download"] + timers["parse"] + timers["sync"]
+
+
+def test_bad_stream_filters_fail_before_any_sync(capsys):
+    """Every stream's row filters are checked before the first stream is synced."""
+    with MockHotjarServer(rows=5) as server:
+        tap = TapHotJar(
+            config={
+                "email": "a@b.c",
+                "password": "x",
+                "api_url": server.api_url,
+                "stream_filters": {
+                    "*": [{"column": "Device", "value": "mobile"}],
+                    "survey_rent_nps_en": [{"column": "Country", "op": "in", "value": "France"}],
+                },
+            },
+            parse_env_config=False,
+        )
+        with pytest.raises(ConfigValidationError, match="survey_rent_nps_en"):
+            tap.sync_all()
+
+    assert capsys.readouterr().out == ""
+
+
+def test_filters_on_unknown_columns_fail_before_any_sync(capsys):
+    """A filter on a column a selected stream does not have would drop all its rows."""
+    tap = TapHotJar(
+        config={
+            "email": "a@b.c",
+            "password": "x",
+            "stream_filters": {"*": [{"column": "Browser", "value": "Chrome"}]},
+        },
+        parse_env_config=False,
+    )
+    stream = tap.streams["survey_rent_nps_en"]
+    stream.schema = {**stream.schema, "properties": dict(stream.schema["properties"])}
+    del stream.schema["properties"]["Browser"]
+    with pytest.raises(ConfigValidationError, match="survey_rent_nps_en.*'Browser'"):
+        tap.sync_all()
+
+    validate_config(tap.config, [tap.streams["survey_b2c_prod_en"]])
+    assert capsys.readouterr().out == ""
@@ -0,0 +1,67 @@
+"""Tests for the Parquet output mode."""
+
+import pytest
+
+from tap_hotjar.parquet import write_partitions
+from tap_hotjar.parsing import ParseOptions, concat_tables, read_export_table
+from tap_hotjar.streams import clean
+from tap_hotjar.tap import TapHotJar
+from tap_hotjar.tests.mock_hotjar import MockHotjarServer
+from tap_hotjar.tests.test_parsing import EXPORT_CSV, make_zip
+
+pq = pytest.importorskip("pyarrow.parquet")
+
+
+def test_partitions_by_survey_and_date(tmp_path):
+    """Each submission date is written to its own partition."""
+    thezip = make_zip({"responses.csv": EXPORT_CSV})
+    table = read_export_table(
+        thezip, thezip.getinfo("responses.csv"), ParseOptions(clean), {"Number": "integer"}
+    )
+
+    paths = write_partitions(table, str(tmp_path), "survey_a", "42")
+
+    assert paths == [
+        str(tmp_path / "stream=survey_a" / "survey_id=42" / f"date={date}" / "part-0.parquet")
+        for date in ["2022-01-01", "2022-01-02", "unknown"]
+    ]
+    assert pq.read_table(paths[0]).column("Number").to_pylist() == [1]
+    assert sum(pq.read_table(path).num_rows for path in paths) == 3
+
+
+@pytest.mark.filterwarnings("error")
+def test_members_with_other_columns_are_concatenated():
+    """Tables of members lacking some columns are merged, without deprecation warnings."""
+    pa = pytest.importorskip("pyarrow")
+
+    table = concat_tables([pa.table({"Number": [1]}), pa.table({"Country": ["France"]})])
+
+    assert table.to_pylist() == [
+        {"Number": 1, "Country": None},
+        {"Number": None, "Country": "France"},
+    ]
+
+
+def test_streams_of_one_survey_keep_their_own_files(tmp_path, capsys):
+    """Two streams reading the same survey write and track separate partitions."""
+    with MockHotjarServer(rows=5) as server:
+        tap = TapHotJar(
+            config={
+                "email": "a@b.c",
+                "password": "x",
+                "api_url": server.api_url,
+                "parquet_output_dir": str(tmp_path),
+            },
+            parse_env_config=False,
+        )
+        streams = [tap.streams["survey_b2c_rent_en"], tap.streams["survey_rent_nps_en"]]
+        assert streams[0].survey_id == streams[1].survey_id
+        for stream in streams:
+            stream.sync()
+    capsys.readouterr()
+
+    for stream in streams:
+        paths = stream.stream_state["parquet_files"]
+        assert paths and all(f"stream={stream.name}" in path for path in paths)
+        assert sum(pq.read_table(path).num_rows for path in paths) == 5
+    assert not list(tmp_path.rglob("*.tmp"))
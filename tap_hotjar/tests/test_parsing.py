@@ -0,0 +1,333 @@
+"""Tests for the survey export parsers."""
+
+import io
+import zipfile
+
+import pytest
+
+from tap_hotjar.parsing import (
+    ParseOptions,
+    RecordBatch,
+    RowFilter,
+    arrow_available,
+    export_members,
+    frame_chunks,
+    frame_records,
+    iter_export,
+    iter_export_chunks,
+    missing_filter_columns,
+    parse_export_batch,
+    read_export,
+    read_export_arrow,
+    verify_members,
+)
+from tap_hotjar.streams import clean
+from tap_hotjar.transforms import hash_value, normalize_text, pii_transform
+
+EXPORT_CSV = (
+    'Number,Date Submitted,"Êtes-vous\nsatisfait ?",Country\n'
+    '1,2022-01-01,"multi\nline, answer",France\n'
+    "2,2022-01-02,NA,\n"
+    "\n"
+    '3,,"a ""quoted"" answer",Brasil\n'
+)
+
+
+def make_zip_bytes(files: dict) -> bytes:
+    """Return a zip archive holding `files`."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as thezip:
+        for name, content in files.items():
+            thezip.writestr(name, content)
+    return buffer.getvalue()
+
+
+def make_zip(files: dict) -> zipfile.ZipFile:
+    """Return an open zip archive holding `files`."""
+    return zipfile.ZipFile(io.BytesIO(make_zip_bytes(files)))
+
+
+def test_streaming_parse_matches_eager_parse():
+    """Row by row parsing emits the same records as the pandas parse."""
+    thezip = make_zip({"responses.csv": EXPORT_CSV})
+    member = thezip.getinfo("responses.csv")
+
+    records = list(read_export(thezip, member, ParseOptions(clean)))
+
+    assert list(iter_export(thezip, member, ParseOptions(clean))) == records
+    assert records[0]["Etes-voussatisfait ?"] == "multi\nline, answer"
+    assert records[1]["Etes-voussatisfait ?"] is None
+
+
+def test_record_batch_matches_eager_parse():
+    """The process pool's record batches hold the same records."""
+    surveys_zip_bin = make_zip_bytes({"responses.csv": EXPORT_CSV})
+    thezip = zipfile.ZipFile(io.BytesIO(surveys_zip_bin))
+
+    batch = parse_export_batch(surveys_zip_bin, ParseOptions(clean), "responses.csv")
+
+    assert len(batch) == 3
+    assert list(batch) == list(read_export(thezip, thezip.getinfo("responses.csv"), ParseOptions(clean)))
+
+
+def test_framed_records_keep_their_types():
+    """Records framed for `post_process_batch` come back unchanged."""
+    batch = RecordBatch(
+        ("Number", "Country"), [(1, "France"), (None, None), (3, "Spain")], {"_sdc_export_member": "a.csv"}
+    )
+    records = [{"Number": 2, "Score": 1.5}, {"Number": None, "Score": None}]
+
+    for data in (batch, records):
+        chunks = list(frame_chunks(data, 2))
+        assert all((chunk.dtypes == object).all() for chunk in chunks)
+        assert [record for chunk in chunks for record in frame_records(chunk)] == list(data)
+    assert list(frame_chunks(records, 2))[0]["Number"].tolist() == [2, None]
+
+
+def test_deselected_columns_are_not_parsed():
+    """Every parser leaves out deselected columns."""
+    surveys_zip_bin = make_zip_bytes({"responses.csv": EXPORT_CSV})
+    thezip = zipfile.ZipFile(io.BytesIO(surveys_zip_bin))
+    member = thezip.getinfo("responses.csv")
+    deselected = frozenset(["Country", "Etes-voussatisfait ?"])
+
+    records = list(read_export(thezip, member, ParseOptions(clean, deselected)))
+
+    assert records[0] == {"Number": "1", "Date Submitted": "2022-01-01"}
+    assert list(iter_export(thezip, member, ParseOptions(clean, deselected))) == records
+    assert list(parse_export_batch(surveys_zip_bin, ParseOptions(clean, deselected), "responses.csv")) == records
+
+
+def test_row_filters_drop_rows_before_records_are_built():
+    """Every parser applies the row filters, also on deselected columns."""
+    surveys_zip_bin = make_zip_bytes({"responses.csv": EXPORT_CSV})
+    thezip = zipfile.ZipFile(io.BytesIO(surveys_zip_bin))
+    member = thezip.getinfo("responses.csv")
+    options = ParseOptions(
+        clean,
+        frozenset(["Country"]),
+        (
+            RowFilter("Country", "in", ["France", "Brasil"]),
+            RowFilter("Number", "lt", 3),
+        ),
+    )
+
+    records = list(read_export(thezip, member, options))
+
+    assert [record["Number"] for record in records] == ["1"]
+    assert "Country" not in records[0]
+    assert list(iter_export(thezip, member, options)) == records
+    assert list(parse_export_batch(surveys_zip_bin, options, "responses.csv")) == records
+
+    since = ParseOptions(clean, filters=(RowFilter("Date Submitted", "gte", "2022-01-02"),))
+    assert [record["Number"] for record in iter_export(thezip, member, since)] == ["2"]
+    assert [record["Number"] for record in read_export(thezip, member, since)] == ["2"]
+
+    absent = ParseOptions(clean, filters=(RowFilter("Device", "eq", "mobile"), *options.filters))
+    assert missing_filter_columns(thezip, member, absent) == ["Device"]
+    assert missing_filter_columns(thezip, member, options) == []
+
+
+def test_row_filter_config_is_validated():
+    """Malformed filter specs are rejected instead of dropping every row."""
+    spec = {"column": "Country", "op": "in", "value": ["France"]}
+    assert RowFilter.from_config(spec).value == {"France"}
+    for spec in (
+        {"column": "Country", "op": "in", "value": "France"},
+        {"column": "Country", "op": "not_in", "value": 3},
+        {"column": "Country", "op": "eq"},
+        {"op": "eq", "value": "France"},
+        {"column": "Country", "op": "like", "value": "Fr%"},
+        "Country = France",
+    ):
+        with pytest.raises(ValueError):
+            RowFilter.from_config(spec)
+
+
+def test_chunked_parse_matches_eager_parse():
+    """Parsing in chunks emits the same records, filters included."""
+    thezip = make_zip({"responses.csv": EXPORT_CSV})
+    member = thezip.getinfo("responses.csv")
+    options = ParseOptions(clean, filters=(RowFilter("Number", "gte", 2),))
+
+    chunks = list(iter_export_chunks(thezip, member, options, chunk_size=1))
+
+    assert [len(chunk) for chunk in chunks] == [0, 1, 1]
+    assert [record for chunk in chunks for record in chunk] == list(
+        read_export(thezip, member, options)
+    )
+
+
+def test_arrow_engine_applies_schema_types():
+    """The arrow engine converts columns to their schema type."""
+    pytest.importorskip("pyarrow")
+    thezip = make_zip({"responses.csv": EXPORT_CSV})
+    member = thezip.getinfo("responses.csv")
+    options = ParseOptions(clean, frozenset(["Country"]))
+
+    batch = read_export_arrow(thezip, member, options, {"Number": "integer"})
+
+    records = list(read_export(thezip, member, options))
+    for record in records:
+        record["Number"] = int(record["Number"])
+    assert list(batch) == records
+
+
+def test_every_parser_applies_schema_types_as_arrow():
+    """Given the schema types, the other parsers type records as the arrow engine."""
+    pytest.importorskip("pyarrow")
+    surveys_zip_bin = make_zip_bytes({"responses.csv": EXPORT_CSV})
+    thezip = zipfile.ZipFile(io.BytesIO(surveys_zip_bin))
+    member = thezip.getinfo("responses.csv")
+    # The answers do not convert, and are kept as strings.
+    types = {"Number": "integer", "Etes-voussatisfait ?": "number"}
+    options = ParseOptions(clean, types=tuple(types.items()))
+
+    records = list(read_export_arrow(thezip, member, options, types))
+
+    assert [record["Number"] for record in records] == [1, 2, 3]
+    assert list(read_export(thezip, member, options)) == records
+    assert list(iter_export(thezip, member, options)) == records
+    assert list(parse_export_batch(surveys_zip_bin, options, "responses.csv")) == records
+    chunks = iter_export_chunks(thezip, member, options, 2)
+    assert [record for chunk in chunks for record in chunk] == records
+
+
+def test_repeated_values_share_one_object():
+    """The batch parsers keep a single string object per distinct value of a column."""
+    csv_text = "Number,Country\n" + "".join(
+        f"{number},{'Costa Rica' if number % 2 else 'United Kingdom'}\n" for number in range(1, 101)
+    )
+    surveys_zip_bin = make_zip_bytes({"responses.csv": csv_text})
+    thezip = zipfile.ZipFile(io.BytesIO(surveys_zip_bin))
+    member = thezip.getinfo("responses.csv")
+    batches = [
+        read_export(thezip, member, ParseOptions(clean)),
+        parse_export_batch(surveys_zip_bin, ParseOptions(clean), "responses.csv"),
+    ]
+    if arrow_available():
+        batches.append(read_export_arrow(thezip, member, ParseOptions(clean), {}))
+
+    for batch in batches:
+        countries = [record["Country"] for record in batch]
+        assert countries[:2] == ["Costa Rica", "United Kingdom"]
+        assert all(country is countries[index % 2] for index, country in enumerate(countries))
+
+
+def test_every_csv_member_is_parsed_and_tagged():
+    """Records of every CSV member are tagged with the member's name."""
+    thezip = make_zip(
+        {"readme.txt": "not a survey", "a.csv": EXPORT_CSV, "b.csv": EXPORT_CSV}
+    )
+    members = export_members(thezip)
+    options = ParseOptions(clean, member_property="member")
+
+    assert [member.filename for member in members] == ["a.csv", "b.csv"]
+    records = [record for member in members for record in iter_export(thezip, member, options)]
+    assert [record["member"] for record in records] == ["a.csv"] * 3 + ["b.csv"] * 3
+    assert list(read_export(thezip, members[1], options)) == records[3:]
+
+
+def test_corrupt_member_fails_before_parsing():
+    """A member whose CRC does not match is rejected up front."""
+    surveys_zip_bin = bytearray(make_zip_bytes({"responses.csv": EXPORT_CSV}))
+    thezip = zipfile.ZipFile(io.BytesIO(bytes(surveys_zip_bin)))
+    member = thezip.getinfo("responses.csv")
+    data_offset = member.header_offset + 30 + len(member.filename)
+    surveys_zip_bin[data_offset + member.compress_size // 2] ^= 0xFF
+    thezip = zipfile.ZipFile(io.BytesIO(bytes(surveys_zip_bin)))
+
+    verify_members(thezip, [member], len(surveys_zip_bin))
+    with pytest.raises(zipfile.BadZipFile):
+        verify_members(thezip, [member], len(surveys_zip_bin), check_crc=True)
+    with pytest.raises(zipfile.BadZipFile):
+        verify_members(thezip, [member], member.header_offset + 10)
+
+
+def test_transforms_run_once_per_distinct_value():
+    """Column transforms apply to every parser, once per distinct value."""
+    thezip = make_zip({"responses.csv": "Number,Answer\n1,a\n2,b\n3,a\n4,\n5,a\n"})
+    member = thezip.getinfo("responses.csv")
+    calls = []
+
+    def upper(value):
+        calls.append(value)
+        return value.upper()
+
+    options = ParseOptions(clean, transforms=(("Answer", upper),))
+
+    records = list(read_export(thezip, member, options))
+
+    assert [record["Answer"] for record in records] == ["A", "B", "A", None, "A"]
+    assert sorted(calls) == ["a", "b"]
+    calls.clear()
+    assert list(iter_export(thezip, member, options)) == records
+    assert sorted(calls) == ["a", "b"]
+
+
+def test_normalize_text():
+    """Answers lose control characters and are normalised to NFC."""
+    assert normalize_text(" Cok iyi\r\nama\x00 pahali\t") == "Cok iyi ama pahali"
+    assert normalize_text("e\u0301te\u0301") == "\u00e9t\u00e9"
+    assert normalize_text("Çok iyi\nama", transliterate=True) == "Cok iyi ama"
+
+
+def test_pii_columns_are_hashed_or_redacted():
+    """PII columns are protected by every parser before records are built."""
+    surveys_zip_bin = make_zip_bytes(
+        {"responses.csv": "Number,User,ICMUserID\n1,alice,7\n2,bob,\n3,alice,9\n"}
+    )
+    thezip = zipfile.ZipFile(io.BytesIO(surveys_zip_bin))
+    member = thezip.getinfo("responses.csv")
+    options = ParseOptions(
+        clean,
+        transforms=(
+            ("User", pii_transform("hash", "s3cret")),
+            ("ICMUserID", pii_transform("redact")),
+        ),
+    )
+
+    records = list(read_export(thezip, member, options))
+
+    assert records[0]["User"] == records[2]["User"] == hash_value("alice", "s3cret")
+    assert records[1]["User"] != hash_value("bob", "other salt")
+    assert all(record["ICMUserID"] is None for record in records)
+    assert list(iter_export(thezip, member, options)) == records
+    assert list(parse_export_batch(surveys_zip_bin, options, "responses.csv")) == records
+    with pytest.raises(ValueError):
+        pii_transform("hash")
+
+
+def test_date_submitted_is_converted_to_utc():
+    """Every parser adds the same UTC timestamp, DST transitions included."""
+    surveys_zip_bin = make_zip_bytes(
+        {
+            "responses.csv": "Number,Date Submitted\n"
+            "1,2024-06-01 12:00:00\n"
+            "2,2024-03-31 02:30:00\n"
+            "3,2024-10-27 02:30:00\n"
+            "4,\n"
+            "5,yesterday\n"
+        }
+    )
+    thezip = zipfile.ZipFile(io.BytesIO(surveys_zip_bin))
+    member = thezip.getinfo("responses.csv")
+    options = ParseOptions(
+        clean,
+        timestamps=(("Date Submitted", "submitted_at"),),
+        timezone="Europe/Paris",
+    )
+
+    records = list(read_export(thezip, member, options))
+
+    assert [record["submitted_at"] for record in records] == [
+        "2024-06-01T10:00:00+00:00",
+        "2024-03-31T01:00:00+00:00",
+        "2024-10-27T00:30:00+00:00",
+        None,
+        None,
+    ]
+    assert list(iter_export(thezip, member, options)) == records
+    assert list(parse_export_batch(surveys_zip_bin, options, "responses.csv")) == records
+    if arrow_available():
+        assert list(read_export_arrow(thezip, member, options, {})) == records
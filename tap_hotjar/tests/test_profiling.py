@@ -0,0 +1,33 @@
+"""Tests for the per stream profiles."""
+
+from tap_hotjar.profiling import SUMMARY_FILENAME
+from tap_hotjar.tap import TapHotJar
+from tap_hotjar.tests.mock_hotjar import MockHotjarServer
+
+
+def test_profile_per_synced_stream_and_summary(tmp_path, capsys):
+    """Each synced stream gets a profile, and all of them are merged in a summary."""
+    with MockHotjarServer(rows=3) as server:
+        tap = TapHotJar(
+            config={
+                "email": "a@b.c",
+                "password": "x",
+                "api_url": server.api_url,
+                "profile_dir": str(tmp_path),
+                # A shard keeps the run short.
+                "shard_count": 20,
+                "shard_index": 0,
+            },
+            parse_env_config=False,
+        )
+        tap.sync_all()
+    capsys.readouterr()
+
+    synced = [name for name, stream in tap.streams.items() if "sync" in stream.metrics.timers]
+    assert synced
+    assert sorted(path.name for path in tmp_path.iterdir()) == sorted(
+        [*(f"{name}.prof" for name in synced), SUMMARY_FILENAME]
+    )
+    summary = (tmp_path / SUMMARY_FILENAME).read_text(encoding="utf-8")
+    assert summary.startswith(f"Merged {len(synced)} stream profiles")
+    assert "sync_stream" in summary
@@ -0,0 +1,78 @@
+"""Tests for stream sharding."""
+
+import datetime
+import json
+
+import pytest
+from singer_sdk.exceptions import ConfigValidationError
+
+from tap_hotjar.scheduling import assign_shards, read_weights, schedule_order
+from tap_hotjar.tap import validate_config
+
+NAMES = [f"survey_{index}" for index in range(50)]
+
+
+def test_unweighted_shards_are_stable():
+    """Hash sharding does not depend on the order or the other streams."""
+    shards = assign_shards(NAMES, 4)
+
+    assert set(shards.values()) == {0, 1, 2, 3}
+    assert assign_shards(reversed(NAMES), 4) == shards
+    assert assign_shards(NAMES[:10], 4) == {name: shards[name] for name in NAMES[:10]}
+
+
+def test_weighted_shards_are_balanced():
+    """Runtime weights spread the heaviest streams over different shards."""
+    weights = {"big_a": 100.0, "big_b": 90.0, "mid": 50.0, "small_a": 10.0, "small_b": 5.0}
+
+    shards = assign_shards(weights, 2, weights)
+
+    assert shards["big_a"] != shards["big_b"]
+    loads = [sum(weights[name] for name in shards if shards[name] == index) for index in (0, 1)]
+    assert sorted(loads) == [115.0, 140.0]
+
+
+def test_schedule_order_longest_and_stale_first():
+    """Unknown streams go first, then by run time boosted by staleness."""
+    now = datetime.datetime(2024, 1, 2, tzinfo=datetime.timezone.utc)
+    fresh = now.isoformat()
+    stats = {
+        "long": {"sync": 100.0, "synced_at": fresh},
+        "short": {"sync": 10.0, "synced_at": fresh},
+        "stale": {"sync": 40.0, "synced_at": (now - datetime.timedelta(days=2)).isoformat()},
+        "prefetched": {"sync": 1.0, "total": 60.0, "synced_at": fresh},
+        # Recorded without a UTC offset.
+        "naive": {"sync": 20.0, "synced_at": "2024-01-01T00:00:00"},
+    }
+
+    order = schedule_order(
+        ["short", "prefetched", "stale", "naive", "new", "long"],
+        stats,
+        now,
+        datetime.timedelta(days=1),
+    )
+
+    assert order == ["new", "stale", "long", "prefetched", "naive", "short"]
+
+
+def test_stale_after_hours_must_be_positive():
+    """A period of zero hours cannot boost stale streams."""
+    validate_config({"stale_after_hours": 0.5})
+    with pytest.raises(ConfigValidationError, match="stale_after_hours"):
+        validate_config({"stale_after_hours": 0})
+
+
+def test_runtime_stats_weigh_by_total_time(tmp_path):
+    """Streams are weighted by their total time, or their sync time without one."""
+    path = tmp_path / "rt.json"
+    path.write_text(
+        json.dumps({
+            "prefetched": {"sync": 0.1, "total": 8.0, "synced_at": "2024-01-01T00:00:00"},
+            "sequential": {"sync": 3.0, "synced_at": "2024-01-01T00:00:00"},
+            "failed": {"synced_at": "2024-01-01T00:00:00"},
+            "manual": 2,
+        }),
+        encoding="utf-8",
+    )
+
+    assert read_weights(str(path)) == {"prefetched": 8.0, "sequential": 3.0, "manual": 2.0}
@@ -0,0 +1,101 @@
+"""Tests for the staging store's change detection."""
+
+import json
+
+import pytest
+
+from tap_hotjar.staging import DELETED_AT_PROPERTY, StagingStore
+from tap_hotjar.tap import TapHotJar
+from tap_hotjar.tests.mock_hotjar import MockHotjarServer
+
+EXPORT = [
+    {"Number": "3", "Country": "France", "_sdc_export_member": "a.csv"},
+    {"Number": "2", "Country": "Spain", "_sdc_export_member": "a.csv"},
+    {"Number": "1", "Country": None, "_sdc_export_member": "a.csv"},
+]
+
+
+def test_only_changes_are_emitted(tmp_path):
+    """A second export only emits new and edited responses, and marks deleted ones."""
+    path = str(tmp_path / "staging.db")
+    with StagingStore(path) as store:
+        assert list(store.changes("survey_a", EXPORT)) == EXPORT
+        assert list(store.changes("survey_b", EXPORT)) == EXPORT
+        store.commit()
+
+    edited = [
+        {"Number": 4, "Country": "Italy", "_sdc_export_member": "b.csv"},
+        {"Number": 3, "Country": "France", "_sdc_export_member": "b.csv"},
+        {"Number": 1, "Country": "Brazil", "_sdc_export_member": "b.csv"},
+        {"Number": None, "Country": "Brazil"},
+    ]
+    with StagingStore(path) as store:
+        assert list(store.changes("survey_a", edited)) == [edited[0], edited[2], edited[3]]
+        assert list(store.deletion_markers("survey_a", "2024-01-01T00:00:00+00:00")) == [
+            {"Number": "2", DELETED_AT_PROPERTY: "2024-01-01T00:00:00+00:00"}
+        ]
+        store.commit()
+        assert list(store.changes("survey_a", edited)) == [edited[3]]
+        assert store.deleted("survey_a") == []
+        assert list(store.changes("survey_b", EXPORT)) == []
+
+
+def test_rolled_back_changes_are_emitted_again(tmp_path):
+    """Changes of a failed sync are still changes on the next one."""
+    with StagingStore(str(tmp_path / "staging.db")) as store:
+        assert len(list(store.changes("survey_a", EXPORT))) == 3
+        store.rollback()
+
+        assert len(list(store.changes("survey_a", EXPORT))) == 3
+        assert store.deleted("survey_a") == []
+
+
+def synced_records(stream, capsys) -> list:
+    """Sync `stream` and return the records it emitted."""
+    stream.sync()
+    messages = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    return [message["record"] for message in messages if message["type"] == "RECORD"]
+
+
+def test_shards_share_a_staging_db(tmp_path, capsys):
+    """A stream syncs while another process has changes staged in the same store."""
+    path = str(tmp_path / "staging.db")
+    with StagingStore(path) as other_shard, MockHotjarServer(rows=6) as server:
+        assert len(list(other_shard.changes("survey_b", EXPORT))) == 3
+
+        config = {
+            "email": "a@b.c",
+            "password": "x",
+            "api_url": server.api_url,
+            "staging_db": path,
+            "emit_deletes": True,
+        }
+        tap = TapHotJar(config=config, parse_env_config=False)
+        assert len(synced_records(tap.streams["survey_b2c_prod_en"], capsys)) == 6
+        other_shard.commit()
+
+        tap = TapHotJar(config=config, parse_env_config=False)
+        assert synced_records(tap.streams["survey_b2c_prod_en"], capsys) == []
+
+    with StagingStore(path) as store:
+        assert list(store.changes("survey_b", EXPORT)) == []
+
+
+def test_deletion_markers_have_the_records_key_type(tmp_path, capsys):
+    """Under the arrow engine, markers of deleted responses have integer Numbers."""
+    pytest.importorskip("pyarrow")
+    config = {
+        "email": "a@b.c",
+        "password": "x",
+        "staging_db": str(tmp_path / "staging.db"),
+        "emit_deletes": True,
+        "csv_engine": "arrow",
+    }
+    for rows in (6, 4):
+        with MockHotjarServer(rows=rows) as server:
+            tap = TapHotJar(config={**config, "api_url": server.api_url}, parse_env_config=False)
+            records = synced_records(tap.streams["survey_b2c_prod_en"], capsys)
+
+    markers = [record for record in records if record.get(DELETED_AT_PROPERTY)]
+    assert sorted(record["Number"] for record in markers) == [5, 6]
+    assert all(isinstance(record["Number"], int) for record in records)
@@ -0,0 +1,95 @@
+"""Tests for the OTLP/JSON trace spans."""
+
+import json
+import time
+
+import pytest
+
+from tap_hotjar.tap import TapHotJar
+from tap_hotjar.tests.mock_hotjar import MockHotjarServer
+from tap_hotjar.tracing import STATUS_ERROR, STATUS_OK, Tracer
+
+
+def read_spans(path) -> list:
+    """Return the spans of an OTLP/JSON lines trace file."""
+    spans = []
+    with open(path, encoding="utf-8") as trace_file:
+        for line in trace_file:
+            (resource_spans,) = json.loads(line)["resourceSpans"]
+            assert resource_spans["resource"]["attributes"] == [
+                {"key": "service.name", "value": {"stringValue": "tap-hotjar"}}
+            ]
+            for scope_spans in resource_spans["scopeSpans"]:
+                spans.extend(scope_spans["spans"])
+    return spans
+
+
+def attributes(span: dict) -> dict:
+    """Return a span's attributes as a plain dict."""
+    return {item["key"]: item["value"]["stringValue"] for item in span["attributes"]}
+
+
+def test_pipelined_sync_spans(tmp_path, capsys):
+    """Stages are children of their stream's sync or prefetch, under sync_all."""
+    trace_file = tmp_path / "trace.jsonl"
+    with MockHotjarServer(rows=3) as server:
+        tap = TapHotJar(
+            config={
+                "email": "a@b.c",
+                "password": "x",
+                "api_url": server.api_url,
+                "trace_file": str(trace_file),
+                "concurrent_exports": 2,
+                # A shard keeps the run short.
+                "shard_count": 20,
+                "shard_index": 0,
+            },
+            parse_env_config=False,
+        )
+        tap.sync_all()
+    capsys.readouterr()
+
+    spans = read_spans(trace_file)
+    by_id = {span["spanId"]: span for span in spans}
+    (root,) = [span for span in spans if "parentSpanId" not in span]
+    assert root["name"] == "sync_all"
+    assert {span["traceId"] for span in spans} == {root["traceId"]}
+    assert all(span["status"] == {"code": STATUS_OK} for span in spans)
+
+    synced = {name for name, stream in tap.streams.items() if "sync" in stream.metrics.timers}
+    for name in ("sync", "prefetch"):
+        children = [span for span in spans if span["name"] == name]
+        assert {attributes(span)["stream"] for span in children} == synced
+        assert all(span["parentSpanId"] == root["spanId"] for span in children)
+    for name in ("export", "download", "parse"):
+        stages = [span for span in spans if span["name"] == name]
+        assert len(stages) == len(synced)
+        for span in stages:
+            parent = by_id[span["parentSpanId"]]
+            assert parent["name"] == "prefetch"
+            assert attributes(parent) == attributes(span)
+            stream = tap.streams[attributes(span)["stream"]]
+            assert attributes(span) == {
+                "stream": stream.name,
+                "site_id": stream.site_id,
+                "survey_id": stream.survey_id,
+            }
+
+
+def test_failed_and_recorded_spans(tmp_path):
+    """Failures set the error status, and recorded spans end when recorded."""
+    tracer = Tracer(str(tmp_path / "trace.jsonl"))
+
+    with pytest.raises(KeyError):
+        with tracer.span("outer", stream="s"):
+            tracer.record("download", 2.5, stream="s")
+            raise KeyError("boom")
+
+    download, outer = read_spans(tmp_path / "trace.jsonl")
+    assert outer["status"] == {"code": STATUS_ERROR, "message": "KeyError('boom')"}
+    assert download["parentSpanId"] == outer["spanId"]
+    start, end = int(download["startTimeUnixNano"]), int(download["endTimeUnixNano"])
+    assert end - start == 2_500_000_000
+    assert end <= int(outer["endTimeUnixNano"]) <= time.time_ns()
+    with Tracer(None).span("ignored") as span:
+        assert span is None
@@ -0,0 +1,152 @@
+"""Trace spans for tap-hotjar syncs, written as OTLP/JSON lines."""
+
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+SERVICE_NAME = "tap-hotjar"
+
+SPAN_KIND_INTERNAL = 1
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+_current_span: "contextvars.ContextVar[Optional[Span]]" = contextvars.ContextVar(
+    "tap_hotjar_current_span", default=None
+)
+
+
+class Span:
+    """A single timed operation within a trace."""
+
+    def __init__(
+        self,
+        name: str,
+        trace_id: str,
+        parent: Optional["Span"],
+        attributes: Dict[str, Any],
+        start_ns: int,
+    ) -> None:
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_span_id = parent.span_id if parent else ""
+        self.attributes = attributes
+        self.start_ns = start_ns
+        self.end_ns = start_ns
+        self.status = STATUS_OK
+        self.message = ""
+
+    def to_otlp(self) -> dict:
+        """Return the span in the OTLP/JSON encoding."""
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": SPAN_KIND_INTERNAL,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [
+                {"key": key, "value": _otlp_value(value)}
+                for key, value in self.attributes.items()
+            ],
+            "status": {"code": self.status},
+        }
+        if self.parent_span_id:
+            span["parentSpanId"] = self.parent_span_id
+        if self.message:
+            span["status"]["message"] = self.message
+        return span
+
+
+def _otlp_value(value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class Tracer:
+    """Records spans of one tap run to a local file.
+
+    Each finished span is appended to `path` as one OTLP/JSON
+    `ExportTraceServiceRequest` per line, the format of the OpenTelemetry
+    collector file exporter. A tracer without a path records nothing.
+    """
+
+    def __init__(self, path: Optional[str]) -> None:
+        self.path = path
+        self.trace_id = os.urandom(16).hex()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+        """Record the wrapped block as a child of the current span."""
+        if not self.path:
+            yield None
+            return
+        span = Span(name, self.trace_id, _current_span.get(), attributes, time.time_ns())
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as ex:
+            span.status = STATUS_ERROR
+            span.message = repr(ex)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end_ns = time.time_ns()
+            self._export(span)
+
+    def record(self, name: str, seconds: float, **attributes: Any) -> None:
+        """Record a child span of the current span that ended just now."""
+        if not self.path:
+            return
+        end_ns = time.time_ns()
+        span = Span(
+            name,
+            self.trace_id,
+            _current_span.get(),
+            attributes,
+            end_ns - int(seconds * 1e9),
+        )
+        span.end_ns = end_ns
+        self._export(span)
+
+    def _export(self, span: Span) -> None:
+        request = {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [
+                            {"key": "service.name", "value": _otlp_value(SERVICE_NAME)}
+                        ]
+                    },
+                    "scopeSpans": [
+                        {"scope": {"name": "tap_hotjar"}, "spans": [span.to_otlp()]}
+                    ],
+                }
+            ]
+        }
+        line = json.dumps(request)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as trace_file:
+                trace_file.write(line + "\n")
+
+
+_tracers: Dict[Optional[str], Tracer] = {}
+_tracers_lock = threading.Lock()
+
+
+def get_tracer(path: Optional[str]) -> Tracer:
+    """Return the tracer shared by everything writing to `path`."""
+    with _tracers_lock:
+        if path not in _tracers:
+            _tracers[path] = Tracer(path)
+        return _tracers[path]
@@ -0,0 +1,59 @@
+"""Value transforms applied to export columns while they are parsed.
+
+A transform maps one non-missing CSV value to its cleaned value. The parsers
+apply it once per distinct value of a column, so it must be a pure function,
+and picklable, since it is also run in the parse process pool.
+"""
+
+import hashlib
+import hmac
+import re
+import unicodedata
+from functools import partial
+from typing import Callable, Optional
+
+from unidecode import unidecode
+
+ValueTransform = Callable[[str], Optional[str]]
+
+# Line breaks and tabs become spaces; the other C0 and C1 control characters
+# are dropped.
+_WHITESPACE_CONTROLS = re.compile(r"[\t\n\r\v\f]+")
+_OTHER_CONTROLS = re.compile(r"[\x00-\x08\x0e-\x1f\x7f-\x9f]")
+
+
+def normalize_text(value: str, transliterate: bool = False) -> str:
+    """Normalise a free text answer.
+
+    Strips control characters, normalises to Unicode NFC and, with
+    `transliterate`, turns the text into ASCII as `clean()` does for headers.
+    """
+    value = _OTHER_CONTROLS.sub("", _WHITESPACE_CONTROLS.sub(" ", value))
+    value = unicodedata.normalize("NFC", value).strip()
+    return unidecode(value) if transliterate else value
+
+
+def text_normalizer(transliterate: bool = False) -> ValueTransform:
+    """Return the answer normalisation transform."""
+    return partial(normalize_text, transliterate=transliterate)
+
+
+def hash_value(value: str, salt: str) -> str:
+    """Return the salted SHA-256 hash (HMAC) of a value, as hex."""
+    return hmac.new(salt.encode("utf-8"), value.encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+def redact_value(value: str) -> None:
+    """Drop a value."""
+    return None
+
+
+def pii_transform(mode: str, salt: Optional[str] = None) -> ValueTransform:
+    """Return the transform protecting a PII column: `hash` or `redact`."""
+    if mode == "hash":
+        if not salt:
+            raise ValueError("Hashing PII columns needs a salt.")
+        return partial(hash_value, salt=salt)
+    if mode == "redact":
+        return redact_value
+    raise ValueError(f"Unknown PII mode '{mode}', expected 'hash' or 'redact'.")